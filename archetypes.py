@@ -0,0 +1,220 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from entities import OWNER_PLAYER
+
+# Extra archetypes are read from every *.json file in this directory, in file name order
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content')
+
+# Built-in weapon IDs; data-file weapons are numbered after these
+WEAPON_NORMAL = 0
+WEAPON_SHOTGUN = 1
+WEAPON_CHARGE = 2
+
+# Behaviour name -> function, for data files to refer to
+ENEMY_BEHAVIOURS = {}
+WEAPON_BEHAVIOURS = {}
+
+# Registries, indexed by ID
+ENEMY_KINDS = []
+WEAPONS = []
+WEAPON_IDS = {}
+
+SPAWN_KINDS = []  # kinds the wave spawner picks from
+UPGRADE_WEAPONS = []  # weapons offered by the upgrade menu, in menu order
+
+
+def enemy_behaviour(name):
+    def register(function):
+        ENEMY_BEHAVIOURS[name] = function
+        return function
+    return register
+
+
+def weapon_behaviour(name):
+    def register(function):
+        WEAPON_BEHAVIOURS[name] = function
+        return function
+    return register
+
+
+class EnemyKind:
+    # `spawn` maps store columns to (low, high) ranges rolled when the wave spawner creates one;
+    # kinds without it are only placed by the level generator. Spawned kinds are the transient
+    # ones that start protection clears away from the player.
+    def __init__(self, id, name, behaviour, color, spawn=None, shoots=False):
+        if behaviour not in ENEMY_BEHAVIOURS:
+            raise ValueError(f"enemy {name!r}: unknown behaviour {behaviour!r}")
+        self.id = id
+        self.name = name
+        self.behaviour = behaviour
+        self.update = ENEMY_BEHAVIOURS[behaviour]
+        self.color = color
+        self.spawn = {field: tuple(bounds) for field, bounds in spawn.items()} if spawn else None
+        self.shoots = shoots
+        # Fastest this kind can close in on the player, so an idle shooter knows how long to sleep
+        self.max_speed = max((abs(v) for field in ('vx', 'vy', 'speed')
+                              for v in (self.spawn or {}).get(field, ())), default=0)
+
+
+class Weapon:
+    # Ammo and cooldown live on World as `<name>_ammo`, `max_<name>_ammo` and `<name>_cooldown`
+    # so they can be tuned per run like any other setting.
+    def __init__(self, id, name, label, behaviour, ammo=20, cooldown=20, pellets=1, spread=0.0,
+                 speed=4, size=2, max_size=2, charge_time=0, pierce=False, upgrade=False):
+        if behaviour not in WEAPON_BEHAVIOURS:
+            raise ValueError(f"weapon {name!r}: unknown behaviour {behaviour!r}")
+        self.id = id
+        self.name = name
+        self.label = label
+        self.behaviour = behaviour
+        self.update = WEAPON_BEHAVIOURS[behaviour]
+        self.ammo = ammo
+        self.cooldown = cooldown
+        self.pellets = pellets
+        self.spread = spread
+        self.speed = speed
+        self.size = size
+        self.max_size = max_size
+        self.charge_time = charge_time
+        self.pierce = pierce
+        self.upgrade = upgrade
+        self.ammo_attr = f"{name}_ammo"
+        self.max_ammo_attr = f"max_{name}_ammo"
+        self.cooldown_attr = f"{name}_cooldown"
+
+
+def register_enemy(name, behaviour, color, **options):
+    kind = EnemyKind(len(ENEMY_KINDS), name, behaviour, color, **options)
+    ENEMY_KINDS.append(kind)
+    if kind.spawn:
+        SPAWN_KINDS.append(kind)
+    return kind
+
+
+def register_weapon(name, label, behaviour, **options):
+    if name in WEAPON_IDS:
+        raise ValueError(f"weapon {name!r} is already registered")
+    weapon = Weapon(len(WEAPONS), name, label, behaviour, **options)
+    WEAPONS.append(weapon)
+    WEAPON_IDS[name] = weapon.id
+    if weapon.upgrade:
+        UPGRADE_WEAPONS.append(weapon)
+    return weapon
+
+
+def load_archetypes(path):
+    # {"enemies": [{"name": ..., "behaviour": ..., "color": ..., ...}], "weapons": [...]}
+    with open(path) as f:
+        data = json.load(f)
+    for spec in data.get('enemies', ()):
+        register_enemy(**spec)
+    for spec in data.get('weapons', ()):
+        register_weapon(**spec)
+
+
+# Enemy behaviours: each moves every enemy of one kind at once. `rows` indexes the store.
+
+@enemy_behaviour('static')
+def update_static(world, kind, rows):
+    pass
+
+
+@enemy_behaviour('stream')
+def update_stream(world, kind, rows):
+    enemies = world.enemies
+    enemies.x[rows] += enemies.vx[rows]
+
+
+@enemy_behaviour('patrol')
+def update_patrol(world, kind, rows):
+    # Walk along vx and turn around at the ends of the platform
+    enemies = world.enemies
+    x = enemies.x
+    x[rows] += enemies.vx[rows]
+    bounce = rows[(x[rows] < enemies.min_x[rows]) | (x[rows] > enemies.max_x[rows])]
+    enemies.vx[bounce] *= -1
+
+
+@enemy_behaviour('chase')
+def update_chase(world, kind, rows):
+    # Follow the shared flow field around terrain; close in directly once near the player
+    enemies = world.enemies
+    x = enemies.x[rows]
+    y = enemies.y[rows]
+    dx = world.player_x - x
+    dy = world.player_y - y
+    dist = np.hypot(dx, dy)
+    dist[dist == 0] = np.inf
+    step_x = dx / dist
+    step_y = dy / dist
+    nav = world.navigation()
+    if nav is not None:
+        next_x, next_y, ok = nav.flow(x + 4, y + 4)
+        flow_x = next_x - (x + 4)
+        flow_y = next_y - (y + 4)
+        flow_dist = np.hypot(flow_x, flow_y)
+        flow_dist[flow_dist == 0] = np.inf
+        step_x = np.where(ok, flow_x / flow_dist, step_x)
+        step_y = np.where(ok, flow_y / flow_dist, step_y)
+    speed = enemies.speed[rows]
+    enemies.x[rows] += step_x * speed
+    enemies.y[rows] += step_y * speed
+
+
+# Weapon behaviours: called once per tick with the player's current weapon and trigger state
+
+@weapon_behaviour('shot')
+def update_shot(world, weapon, held, released):
+    # Fires `pellets` bullets fanned out `spread` apart while the trigger is held
+    if not held or world.player_shoot_cooldown != 0:
+        return
+    if getattr(world, weapon.ammo_attr) <= 0:
+        return
+    for i in range(weapon.pellets):
+        world.bullets.add(
+            x=world.player_x + 4, y=world.player_y + 4, vx=weapon.speed * world.player_direction,
+            vy=(i - (weapon.pellets - 1) / 2) * weapon.spread, color=5, owner=OWNER_PLAYER, size=weapon.size
+        )
+    world.player_shoot_cooldown = getattr(world, weapon.cooldown_attr)
+    setattr(world, weapon.ammo_attr, getattr(world, weapon.ammo_attr) - 1)
+
+
+@weapon_behaviour('charge')
+def update_charge(world, weapon, held, released):
+    # Holding the trigger grows the shot; releasing fires it, costing more ammo the bigger it is
+    if held:
+        world.charge_level = min(world.charge_level + 1, weapon.charge_time)
+    if released and world.player_shoot_cooldown == 0:
+        ammo_cost = 1 + (world.charge_level // 10) # 1 to 10 bullets
+        ammo = getattr(world, weapon.ammo_attr)
+        if ammo >= ammo_cost:
+            bullet_size = weapon.size + int((world.charge_level / weapon.charge_time) * (weapon.max_size - weapon.size))
+            bullet_x = world.player_x + 4 - bullet_size / 2
+            bullet_y = world.player_y + 4 - bullet_size / 2
+            world.bullets.add(
+                x=bullet_x, y=bullet_y, vx=weapon.speed * world.player_direction,
+                vy=0, color=5, owner=OWNER_PLAYER, size=bullet_size
+            )
+            world.player_shoot_cooldown = getattr(world, weapon.cooldown_attr)
+            setattr(world, weapon.ammo_attr, ammo - ammo_cost)
+        world.charge_level = 0
+
+
+# Built-in archetypes, registered in ID order (enemy IDs match ENEMY_* in entities.py)
+
+register_enemy('patrol', 'patrol', 8)
+register_enemy('shooter', 'static', 14, shoots=True)
+register_enemy('stream', 'stream', 9, spawn={'vx': (-1.0, -2.0)})
+register_enemy('chase', 'chase', 10, spawn={'speed': (0.4, 0.8)})
+
+register_weapon('normal', "NORMAL", 'shot', cooldown=20)
+register_weapon('shotgun', "SHOTGUN", 'shot', cooldown=60, pellets=3, spread=0.5, upgrade=True)
+register_weapon('charge', "CHARGE SHOT", 'charge', cooldown=20, max_size=24, charge_time=90,
+                pierce=True, upgrade=True)
+
+for path in sorted(glob.glob(os.path.join(CONTENT_DIR, '*.json'))):
+    load_archetypes(path)
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from entities import ENEMY_CHASE, OWNER_PLAYER
+from levelgen import GROUND_Y
+from profiler import FrameProfiler, PHASES
+from world import World, SCREEN_WIDTH, SCREEN_HEIGHT, BTN_RIGHT, BTN_JUMP, BTN_FIRE, BTN_CONFIRM, BTN_RESTART
+
+BASELINE_PATH = "bench_baseline.json"
+REGRESSION_TOLERANCE = 0.10  # fail when frames/sec drops by more than this fraction
+# Standing shots seeded into the storm scenario; the player's own shots leave the view too fast
+# to ever build up more than a few dozen
+STORM_BULLETS = 4000
+
+
+def menu_inputs(world):
+    # Starts and restarts runs and confirms the weapon menu, pressing on alternate frames
+    if world.game_over or world.game_clear:
+        return BTN_RESTART if world.frame % 2 else 0
+    if not world.game_started or world.game_paused:
+        return BTN_CONFIRM if world.frame % 2 else 0
+    return None
+
+
+def runner_bot(world):
+    # Runs right holding fire and jumps when there is no ground just ahead
+    menu = menu_inputs(world)
+    if menu is not None:
+        return menu
+    probe = world.player_x + 20
+    gap_ahead = not any(x <= probe < x + w for x, y, w, h, col in world.stage_grid.query(probe, GROUND_Y, 1, 1))
+    return BTN_RIGHT | BTN_FIRE | (BTN_JUMP if gap_ahead and world.frame % 2 else 0)
+
+
+def turret_bot(world):
+    # Stands still and fires into the swarm
+    menu = menu_inputs(world)
+    return BTN_FIRE if menu is None else menu
+
+
+def storm_bot(world):
+    # Charge weapon with no cooldown: press and release fire on alternate frames
+    menu = menu_inputs(world)
+    if menu is not None:
+        return menu
+    return BTN_FIRE if world.frame % 2 else 0
+
+
+def invincible(world):
+    world.player_health = 10**9
+
+
+def setup_swarm(world):
+    invincible(world)
+    world.start_protection_timer = 0
+    world.max_enemies = 2000
+    for i in range(world.max_enemies):
+        world.enemies.add(x=world.player_x + 40 + (i * 37) % 200, y=40 + (i * 13) % 90,
+                          speed=0.4 + (i % 5) * 0.1, kind=ENEMY_CHASE, color=10)
+
+
+def setup_storm(world):
+    invincible(world)
+    world.weapon_type = 'charge'
+    world.charge_cooldown = 0
+    world.charge_ammo = world.max_charge_ammo = 10**9
+    world.max_enemies = 500
+    world.enemy_spawn_interval = (1, 2)
+    world.start_protection_timer = 0
+    # Piercing shots drifting at most 0.04px a tick, kept 40px inside the view so none reaches
+    # the culling edge before the run ends
+    left = world.camera_x + 40
+    for i in range(STORM_BULLETS):
+        world.bullets.add(x=left + (i * 37) % (SCREEN_WIDTH - 80), y=20 + (i * 13) % (SCREEN_HEIGHT - 40),
+                          vx=(i % 9 - 4) * 0.01, vy=(i % 5 - 2) * 0.01, size=2, owner=OWNER_PLAYER, color=5)
+
+
+def setup_wide(world):
+    invincible(world)
+    world.player_x = world.last_player_x = 200  # skip the first gap so the bot isn't stuck on it
+    world.time_left = 10**9
+
+
+SCENARIOS = {
+    # name: (config applied before start, setup after start, policy, frames)
+    'swarm': ({}, setup_swarm, turret_bot, 600),
+    'storm': ({}, setup_storm, storm_bot, 1200),
+    'wide': ({'world_width': 2048 * 64}, setup_wide, runner_bot, 3000),
+    'playthrough': ({}, None, runner_bot, 10 * 60 * 60),
+}
+
+
+def run_scenario(name, seed=1, profile=True):
+    config, setup, policy, frames = SCENARIOS[name]
+    world = World(seed=seed)
+    for attr, value in config.items():
+        setattr(world, attr, value)
+    world.step(BTN_CONFIRM)
+    if setup is not None:
+        setup(world)
+
+    profiler = FrameProfiler(window=frames, keep_trace=False) if profile else None
+    if profiler:
+        profiler.attach(world)
+    start = time.perf_counter()
+    for _ in range(frames):
+        if profiler:
+            profiler.begin_frame()
+        world.step(policy(world))
+        if profiler:
+            profiler.end_frame(world)
+    elapsed = time.perf_counter() - start
+    return world, frames, elapsed, profiler
+
+
+def measure(name, seed=1, memory=True, repeat=3):
+    # Best of several runs, since a single run is at the mercy of whatever else the machine is doing
+    runs = [run_scenario(name, seed) for _ in range(repeat)]
+    world, frames, elapsed, profiler = min(runs, key=lambda run: run[2])
+    stats = profiler.stats()
+    result = {
+        'frames': frames,
+        'fps': frames / elapsed,
+        'p50_ms': stats['p50_ms'],
+        'p99_ms': stats['p99_ms'],
+        'phases_ms': {phase: stats[phase + '_ms'] for phase in PHASES if phase != 'draw'},
+        'state_hash': world.state_hash().hex(),
+    }
+    if memory:
+        # Separate pass: tracemalloc slows the simulation down too much to time it at the same time
+        tracemalloc.start()
+        run_scenario(name, seed, profile=False)
+        result['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['fps'] / base['fps']
+        line = f"  {name}: {ratio:.2f}x baseline fps"
+        if 'peak_kb' in result and 'peak_kb' in base:
+            line += f", {result['peak_kb'] / base['peak_kb']:.2f}x baseline peak memory"
+        if result['state_hash'] != base['state_hash']:
+            line += " (simulation diverged from baseline)"
+        print(line)
+        if ratio < 1 - REGRESSION_TOLERANCE:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless game-loop benchmarks")
+    parser.add_argument('scenarios', nargs='*', help=f"any of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        result = measure(name, args.seed, memory=not args.no_memory, repeat=args.repeat)
+        results[name] = result
+        phases = " ".join(f"{phase}={ms:.3f}" for phase, ms in result['phases_ms'].items())
+        memory = f" peak={result['peak_kb']:.0f}KB" if 'peak_kb' in result else ""
+        print(f"{name:12} {result['fps']:9.0f} fps  p50={result['p50_ms']:.3f}ms "
+              f"p99={result['p99_ms']:.3f}ms{memory}\n{'':12} {phases}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import time
+
+TICK_RATE = 60
+
+
+class FixedStepClock:
+    # Converts elapsed wall time into whole simulation ticks. Time the caller couldn't
+    # simulate within max_catchup ticks is dropped rather than carried into the next frame.
+    def __init__(self, tick_rate=TICK_RATE, max_catchup=5, now=time.perf_counter):
+        self.tick = 1 / tick_rate
+        self.max_catchup = max_catchup
+        self.now = now
+        self.last = None
+        self.accumulator = 0.0
+        self.dropped_ticks = 0
+
+    def advance(self, speed=1):
+        now = self.now()
+        if self.last is not None:
+            self.accumulator += (now - self.last) * speed
+        self.last = now
+        ticks = int(self.accumulator / self.tick + 1e-6)  # absorb float drift in frame deltas
+        cap = self.max_catchup * speed
+        if ticks > cap:
+            self.dropped_ticks += ticks - cap
+            self.accumulator = max(self.accumulator - ticks * self.tick, 0.0)
+            return cap
+        self.accumulator -= ticks * self.tick
+        return ticks
@@ -0,0 +1,166 @@
+import numpy as np
+
+# Enemy kinds
+ENEMY_PATROL = 0
+ENEMY_SHOOTER = 1
+ENEMY_STREAM = 2
+ENEMY_CHASE = 3
+
+# Bullet owners
+OWNER_PLAYER = 0
+OWNER_ENEMY = 1
+
+# Stores and pools are allocated up front at these sizes so the game loop doesn't allocate
+ENEMY_CAPACITY = 256
+BULLET_CAPACITY = 1024
+PICKUP_CAPACITY = 16
+
+# Enemies placed by the level record where they came from in the 'origin' column, as
+# chunk index * ORIGIN_STRIDE + ordinal within the chunk + 1; 0 marks runtime spawns
+ORIGIN_STRIDE = 256
+
+ENEMY_COLUMNS = {
+    'x': np.float64, 'y': np.float64, 'vx': np.float64, 'vy': np.float64,
+    'speed': np.float64, 'size': np.float64, 'min_x': np.float64, 'max_x': np.float64,
+    'uid': np.int64, 'origin': np.int64, 'kind': np.int8, 'color': np.int8,
+}
+
+BULLET_COLUMNS = {
+    'x': np.float64, 'y': np.float64, 'vx': np.float64, 'vy': np.float64,
+    'size': np.float64, 'owner': np.int8, 'color': np.int8,
+}
+
+
+class EntityStore:
+    # Struct-of-arrays: one typed column per field, rows [0, count) are in use.
+    # Rows are killed by clearing `alive` and packed back together by compact().
+    # Stores with a 'uid' column give each row an id that survives compaction (see row_of).
+    def __init__(self, columns, capacity=64):
+        self.columns = dict(columns)
+        self.capacity = capacity
+        self.count = 0
+        self.alive = np.zeros(capacity, dtype=bool)
+        for name, dtype in self.columns.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.rows = {} if 'uid' in self.columns else None
+        self.next_uid = 1
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        self.capacity *= 2
+        self.alive = np.resize(self.alive, self.capacity)
+        self.alive[self.count:] = False
+        for name in self.columns:
+            setattr(self, name, np.resize(getattr(self, name), self.capacity))
+
+    def add(self, **values):
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        for name in self.columns:
+            getattr(self, name)[i] = values.get(name, 0)
+        if self.rows is not None:
+            self.uid[i] = self.next_uid
+            self.rows[self.next_uid] = i
+            self.next_uid += 1
+        self.alive[i] = True
+        self.count += 1
+        return i
+
+    def load(self, count, columns, next_uid=1):
+        while self.capacity < count:
+            self._grow()
+        for name, values in zip(self.columns, columns):
+            getattr(self, name)[:count] = values
+        self.alive[:count] = True
+        self.alive[count:] = False
+        self.count = count
+        self.next_uid = next_uid
+        if self.rows is not None:
+            self.rows = {uid: row for row, uid in enumerate(self.uid[:count].tolist())}
+
+    def clear(self):
+        self.alive[:self.count] = False
+        self.count = 0
+        if self.rows is not None:
+            self.rows.clear()
+
+    def row_of(self, uid):
+        # Current row of a live entity, or -1 once it has been killed
+        row = self.rows.get(uid, -1)
+        return row if row >= 0 and self.alive[row] else -1
+
+    def kill(self, mask_or_index):
+        self.alive[:self.count][mask_or_index] = False
+
+    def compact(self):
+        # Batched swap-remove: live rows from the tail fill the dead holes at the front
+        n = self.count
+        alive = self.alive[:n]
+        keep = int(np.count_nonzero(alive))
+        if keep == n:
+            return
+        holes = np.flatnonzero(~alive[:keep])
+        movers = np.flatnonzero(alive[keep:]) + keep
+        if self.rows is not None:
+            for uid in self.uid[:n][~alive].tolist():
+                del self.rows[uid]
+        for name in self.columns:
+            column = getattr(self, name)
+            column[holes] = column[movers]
+        if self.rows is not None:
+            for row, uid in zip(holes.tolist(), self.uid[holes].tolist()):
+                self.rows[uid] = row
+        self.alive[:keep] = True
+        self.alive[keep:n] = False
+        self.count = keep
+
+
+class Pickup:
+    __slots__ = ('x', 'y', 'w', 'h', 'color')
+
+    def values(self):
+        return self.x, self.y, self.w, self.h, self.color
+
+
+class PickupPool:
+    # Fixed set of Pickup records. Releasing one puts it back on the free list instead of
+    # discarding it; spawning when the pool is exhausted drops the pickup.
+    def __init__(self, capacity=PICKUP_CAPACITY):
+        self.free = [Pickup() for _ in range(capacity)]
+        self.active = []
+
+    def __len__(self):
+        return len(self.active)
+
+    def __iter__(self):
+        return iter(self.active)
+
+    def spawn(self, x, y, w, h, color):
+        if not self.free:
+            return None
+        pickup = self.free.pop()
+        pickup.x = x
+        pickup.y = y
+        pickup.w = w
+        pickup.h = h
+        pickup.color = color
+        self.active.append(pickup)
+        return pickup
+
+    def release_at(self, i):
+        # Swap-remove; callers walking the pool should iterate indices from the end
+        active = self.active
+        pickup = active[i]
+        active[i] = active[-1]
+        active.pop()
+        self.free.append(pickup)
+
+    def clear(self):
+        while self.active:
+            self.free.append(self.active.pop())
+
+    def values(self):
+        return tuple(pickup.values() for pickup in self.active)
@@ -0,0 +1,186 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+
+import numpy as np
+
+from levelgen import GENERATOR_VERSION, Chunk, chunk_count, generate_chunk
+
+# Level file: header, one row of counts per chunk, then every chunk's stage rects, spikes,
+# coins and enemies as flat little-endian arrays. Opening one maps it and computes offsets;
+# a chunk is only turned into Python objects when the world asks for it.
+MAGIC = b'CXLV'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQIII')  # magic, format version, generator version, seed, width, safe zone, chunks
+COUNTS = np.dtype('<u4')  # stage, spikes, coins, enemies per chunk
+RECT = np.dtype('<i4')  # (x, y, w, h, color)
+ENEMY = np.dtype([
+    ('x', '<f8'), ('y', '<f8'), ('vx', '<f8'), ('min_x', '<f8'), ('max_x', '<f8'),
+    ('timer', '<i4'), ('kind', 'i1'), ('color', 'i1'),
+])
+
+# Level files kept mapped at once when nothing is using them; each restart normally moves
+# on to a new level
+OPEN_LEVELS = 4
+# Size the cache directory is kept under; the least recently opened files go first
+DISK_BYTES = 64 << 20
+
+
+def level_filename(seed, world_width, enemy_safe_zone):
+    return f"{seed:08x}-{world_width}-{enemy_safe_zone}-g{GENERATOR_VERSION}.lvl"
+
+
+def write_level(path, seed, world_width, enemy_safe_zone):
+    chunks = [generate_chunk(seed, index, world_width, enemy_safe_zone) for index in range(chunk_count(world_width))]
+    counts = np.array([(len(c.stage), len(c.spikes), len(c.coins), len(c.enemies)) for c in chunks], dtype=COUNTS)
+    enemies = np.array([tuple(enemy.get(field, 0) for field in ENEMY.names)
+                        for chunk in chunks for enemy in chunk.enemies], dtype=ENEMY)
+
+    # Written under a temporary name so a crash never leaves a truncated level behind
+    partial = path + '.partial'
+    with open(partial, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, GENERATOR_VERSION, seed, world_width, enemy_safe_zone, len(chunks)))
+        f.write(counts.tobytes())
+        for part in ('stage', 'spikes', 'coins'):
+            rects = [rect for chunk in chunks for rect in getattr(chunk, part)]
+            f.write(np.array(rects, dtype=RECT).reshape(-1, 5).tobytes())
+        f.write(enemies.tobytes())
+    os.replace(partial, path)
+
+
+class LevelFile:
+    def __init__(self, path):
+        self.users = 0  # worlds reading from it; the cache never closes a file that has any
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, generator, self.seed, self.world_width, self.enemy_safe_zone, chunks = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or generator != GENERATOR_VERSION:
+            self.close()
+            raise ValueError(f"{path}: not a level file for this generator")
+        offset = HEADER.size
+        self.counts = np.frombuffer(self.map, dtype=COUNTS, count=chunks * 4, offset=offset).reshape(chunks, 4)
+        offset += self.counts.nbytes
+        totals = self.counts.sum(axis=0, dtype=np.int64).tolist()
+        # Row where each chunk starts within each section
+        self.starts = np.zeros((chunks + 1, 4), dtype=np.int64)
+        np.cumsum(self.counts, axis=0, out=self.starts[1:])
+        self.sections = []
+        for total in totals[:3]:
+            self.sections.append(np.frombuffer(self.map, dtype=RECT, count=total * 5, offset=offset).reshape(total, 5))
+            offset += total * 5 * RECT.itemsize
+        self.enemies = np.frombuffer(self.map, dtype=ENEMY, count=totals[3], offset=offset)
+
+    def chunk(self, index):
+        start = self.starts[index].tolist()
+        end = self.starts[index + 1].tolist()
+        chunk = Chunk(index)
+        chunk.stage, chunk.spikes, chunk.coins = (
+            [tuple(rect) for rect in section[s:e].tolist()]
+            for section, s, e in zip(self.sections, start, end)
+        )
+        for x, y, vx, min_x, max_x, timer, kind, color in self.enemies[start[3]:end[3]].tolist():
+            chunk.enemies.append(dict(x=x, y=y, vx=vx, min_x=min_x, max_x=max_x, timer=timer, kind=kind, color=color))
+        return chunk
+
+    def close(self):
+        # Views into the map must go before it can be closed
+        self.counts = self.sections = self.enemies = None
+        self.map.close()
+
+
+class LevelCache:
+    # A directory of level files keyed by seed, size and generator version. Missing levels are
+    # generated and written on first use (unless build=False), then memory-mapped. Past
+    # max_bytes on disk (None for no limit) the least recently opened files are deleted.
+    def __init__(self, directory, build=True, max_bytes=DISK_BYTES):
+        self.directory = directory
+        self.build = build
+        self.max_bytes = max_bytes
+        self.levels = {}  # (seed, world_width, enemy_safe_zone) -> LevelFile, least recently used first
+        self.pending = {}  # key -> thread writing that level file
+
+    def prepare(self, seed, world_width, enemy_safe_zone):
+        # Starts writing a level file in the background, so opening it later only has to map it
+        key = (seed, world_width, enemy_safe_zone)
+        if not self.build or key in self.levels or key in self.pending:
+            return
+        path = os.path.join(self.directory, level_filename(*key))
+        if not os.path.exists(path):
+            self.pending[key] = threading.Thread(target=self._write, args=(path, key), daemon=True)
+            self.pending[key].start()
+
+    def _write(self, path, key):
+        os.makedirs(self.directory, exist_ok=True)
+        write_level(path, *key)
+
+    def open(self, seed, world_width, enemy_safe_zone):
+        key = (seed, world_width, enemy_safe_zone)
+        writer = self.pending.pop(key, None)
+        if writer is not None:
+            writer.join()
+        level = self.levels.pop(key, None)
+        mapped = level is None
+        if mapped:
+            path = os.path.join(self.directory, level_filename(*key))
+            if not os.path.exists(path):
+                if not self.build:
+                    return None
+                self._write(path, key)
+            else:
+                os.utime(path)  # the file's mtime is when it was last opened
+            level = LevelFile(path)
+            idle = [k for k, open_level in self.levels.items() if not open_level.users]
+            for k in idle[:len(self.levels) - OPEN_LEVELS + 1]:
+                self.levels.pop(k).close()
+        self.levels[key] = level
+        level.users += 1
+        if mapped:
+            self.prune()
+        return level
+
+    def prune(self):
+        # Deletes the least recently opened level files until the directory fits in max_bytes,
+        # never one that is mapped or still being written
+        if self.max_bytes is None:
+            return
+        keep = {level_filename(*key) for key in (*self.levels, *self.pending)}
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.lvl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        total = sum(size for _, size, _, _ in files)
+        for _, size, path, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if name not in keep:
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def release(self, level):
+        # Hands back a file from open(); it stays mapped until evicted
+        level.users -= 1
+
+    def close(self):
+        for level in self.levels.values():
+            level.close()
+        self.levels = {}
+
+
+if __name__ == '__main__':
+    # Prebuild a level pack: python levelcache.py DIR LEVEL_SEED [LEVEL_SEED ...]
+    from world import World
+    defaults = World(seed=0)
+    cache = LevelCache(sys.argv[1], max_bytes=None)
+    for seed in sys.argv[2:]:
+        cache.open(int(seed, 0), defaults.world_width, defaults.enemy_safe_zone)
+    cache.close()
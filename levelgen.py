@@ -0,0 +1,110 @@
+import bisect
+import random
+
+from archetypes import ENEMY_KINDS
+from entities import ENEMY_PATROL, ENEMY_SHOOTER
+
+# Bump whenever generate_chunk's output changes, so cached level files are rebuilt
+GENERATOR_VERSION = 1
+CHUNK_WIDTH = 256
+GROUND_Y = 132
+TERRAIN_TOP = 92  # nothing static is generated above this line
+PLATFORMS_PER_CHUNK = 2
+PLATFORM_MIN_GAP = 24
+
+
+class IntervalSet:
+    # Disjoint [start, end) intervals sorted by start, so an overlap test is one bisect
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def overlaps(self, start, end):
+        i = bisect.bisect_left(self.starts, end)
+        return i > 0 and self.ends[i - 1] > start
+
+    def add(self, start, end):
+        i = bisect.bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+
+class Chunk:
+    def __init__(self, index):
+        self.index = index
+        self.x = index * CHUNK_WIDTH
+        self.stage = []
+        self.spikes = []
+        self.coins = []
+        self.enemies = []
+
+
+def chunk_count(world_width):
+    return -(-world_width // CHUNK_WIDTH)
+
+
+def generate_chunk(seed, index, world_width, enemy_safe_zone):
+    # Each chunk depends only on (seed, index), so it can be rebuilt after being evicted
+    rng = random.Random(seed * 1000003 + index)
+    chunk = Chunk(index)
+    start = chunk.x
+    end = min(start + CHUNK_WIDTH, world_width)
+
+    current_x = start
+    while current_x < end:
+        ground_length = min(rng.randint(80, 200), end - current_x)
+        chunk.stage.append((current_x, GROUND_Y, ground_length, 28, 3))
+        current_x += ground_length
+        if current_x < world_width - 150:
+            gap_width = rng.randint(32, 56)
+            current_x += gap_width
+
+    for x, y, w, h, col in chunk.stage:
+        for i in range(x, x + w, 64):
+            if rng.random() < 0.35 and i > 80:
+                spike_x = rng.randint(i, i + 48)
+                if spike_x < x + w - 16:
+                    chunk.spikes.append((spike_x, 124, 16, 8, 6))
+
+    # Platforms keep half the gap from the chunk edges so neighbouring chunks never crowd them
+    platforms = IntervalSet()
+    margin = PLATFORM_MIN_GAP // 2
+    low = max(start + margin, 100)
+    for _ in range(PLATFORMS_PER_CHUNK):
+        for _ in range(100):
+            plat_w = rng.randint(40, 80)
+            high = min(end - margin, world_width - 100) - plat_w
+            if high < low:
+                break
+            plat_x = rng.randint(low, high)
+            plat_y = rng.choice([TERRAIN_TOP, 108])
+            if not platforms.overlaps(plat_x, plat_x + plat_w + PLATFORM_MIN_GAP):
+                platforms.add(plat_x, plat_x + plat_w + PLATFORM_MIN_GAP)
+                chunk.stage.append((plat_x, plat_y, plat_w, 8, 3))
+                break
+
+    for x, y, w, h, col in chunk.stage:
+        for i in range(x, x + w, 16):
+            if rng.random() < 0.2:
+                chunk.coins.append((i + 4, y - 12, 8, 8, 10))
+
+    has_patrol = False
+    has_shooter = False
+    for x, y, w, h, col in chunk.stage:
+        if y == GROUND_Y and w > 60 and rng.random() < 0.5 and not has_patrol:
+            enemy_x = x + 10
+            if enemy_x >= enemy_safe_zone:
+                chunk.enemies.append(dict(
+                    x=enemy_x, y=y - 8, vx=rng.choice([-0.8, 0.8]),
+                    kind=ENEMY_PATROL, min_x=x, max_x=x + w - 8, color=ENEMY_KINDS[ENEMY_PATROL].color
+                ))
+                has_patrol = True
+        elif y != GROUND_Y and w > 40 and rng.random() < 0.4 and not has_shooter:
+            enemy_x = x + w // 2 - 4
+            chunk.enemies.append(dict(
+                x=enemy_x, y=y - 8, kind=ENEMY_SHOOTER, timer=rng.randint(60, 120),
+                color=ENEMY_KINDS[ENEMY_SHOOTER].color
+            ))
+            has_shooter = True
+
+    return chunk
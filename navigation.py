@@ -0,0 +1,144 @@
+import numpy as np
+
+# Every stage and spike edge the level generator emits is 4px off a multiple of 8 vertically,
+# so offsetting the rows by 4px lines the cells up with the terrain exactly
+NAV_CELL = 8
+NAV_OFFSET_Y = 4
+# The flow field is retargeted at most this often, and shared by every chaser in between
+FLOW_FIELD_INTERVAL = 8
+# Columns kept either side of the viewport (inside the chunks stream_level keeps loaded)
+NAV_MARGIN = 32
+# Within this many cells of the target, chasers steer straight at the player instead
+FLOW_NEAR = 2
+
+# Neighbour steps as (dc, dr), orthogonal first so ties prefer them
+STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+STEP_COL = np.array([dc for dc, dr in STEPS])
+STEP_ROW = np.array([dr for dc, dr in STEPS])
+
+
+class NavGrid:
+    # Stage and spikes rasterised over a window of the level, with a flow field that points
+    # every free cell at the centre of its neighbour one step closer to a target cell, and
+    # memoised sight lines.
+    def __init__(self, height, cell_size=NAV_CELL, offset_y=NAV_OFFSET_Y):
+        self.cell_size = cell_size
+        self.offset_y = offset_y
+        self.rows = -(-(height + offset_y) // cell_size)
+        self.cols = 0
+        self.x0 = 0
+        self.key = None
+        self.solid = None
+        self.dist = None
+        self.next_x = None
+        self.next_y = None
+        self.steer = None
+        self.sight = {}
+
+    def build(self, key, x0, width, rects, target_col, target_row):
+        cs = self.cell_size
+        rows = self.rows
+        cols = -(-width // cs)
+        solid = np.zeros((rows, cols), dtype=bool)
+        for x, y, w, h, col in rects:
+            c0 = max(int(x - x0) // cs, 0)
+            c1 = min(-(-int(x + w - x0) // cs), cols)
+            r0 = max(int(y + self.offset_y) // cs, 0)
+            r1 = min(-(-int(y + h + self.offset_y) // cs), rows)
+            if c0 < c1 and r0 < r1:
+                solid[r0:r1, c0:c1] = True
+
+        # Breadth-first search out from the target over free cells (4-connected). The grid is
+        # padded with a wall border so neighbours need no bounds checks; -2 marks walls.
+        span = cols + 2
+        padded = np.full((rows + 2, span), -2, dtype=np.int64)
+        padded[1:-1, 1:-1] = np.where(solid, -2, -1)
+        dist = padded.ravel().tolist()
+        target_col -= x0 // cs
+        if 0 <= target_col < cols and 0 <= target_row < rows:
+            start = (target_row + 1) * span + target_col + 1
+            dist[start] = 0
+            queue = [start]
+            for i in queue:
+                d = dist[i] + 1
+                for j in (i - 1, i + 1, i - span, i + span):
+                    if dist[j] == -1:
+                        dist[j] = d
+                        queue.append(j)
+
+        # Each cell points at its closest neighbour, without cutting corners past walls
+        dist = np.array(dist, dtype=np.float64).reshape(rows + 2, span)[1:-1, 1:-1]
+        dist[dist < 0] = np.inf
+        padded = np.full((rows + 2, cols + 2), np.inf)
+        padded[1:-1, 1:-1] = dist
+        around = np.stack([padded[1 + dr:rows + 1 + dr, 1 + dc:cols + 1 + dc] for dc, dr in STEPS])
+        for k, (dc, dr) in enumerate(STEPS[4:], 4):
+            corner = np.isinf(around[STEPS.index((dc, 0))]) | np.isinf(around[STEPS.index((0, dr))])
+            around[k][corner] = np.inf
+        best = around.argmin(axis=0)
+        downhill = np.take_along_axis(around, best[None], axis=0)[0] < dist
+
+        self.key = key
+        self.x0 = x0
+        self.cols = cols
+        self.solid = solid
+        self.dist = dist
+        # Flattened for lookups by cells() index
+        col, row = np.meshgrid(np.arange(cols), np.arange(rows))
+        self.next_x = (x0 + (col + STEP_COL[best] + 0.5) * cs).ravel()
+        self.next_y = ((row + STEP_ROW[best] + 0.5) * cs - self.offset_y).ravel()
+        self.steer = (downhill & (dist > FLOW_NEAR)).ravel()
+        self.sight = {}
+
+    def cell_of(self, x, y):
+        # Absolute (column, row) of a point
+        return int(x // self.cell_size), int((y + self.offset_y) // self.cell_size)
+
+    def cells(self, x, y):
+        # Flat window cell index for arrays of points (0 where outside), and which are inside
+        col = (x - self.x0) / self.cell_size
+        row = (y + self.offset_y) / self.cell_size
+        inside = (col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+        index = row.astype(np.intp) * self.cols + col.astype(np.intp)
+        return np.where(inside, index, 0), inside
+
+    def flow(self, x, y):
+        # Where entities centred at the given points should head next; `ok` is False where the
+        # field has no useful answer (outside the window, unreachable, or close to the target)
+        index, inside = self.cells(x, y)
+        return self.next_x[index], self.next_y[index], inside & self.steer[index]
+
+    def line_of_sight(self, x0, y0, x1, y1):
+        # Answered cell to cell, so the cached result holds for any two points in those cells
+        cs = self.cell_size
+        key = self.cell_of(x0, y0) + self.cell_of(x1, y1)
+        clear = self.sight.get(key)
+        if clear is None:
+            # Sample between the cell centres every half cell; outside the window counts as open
+            c0, r0, c1, r1 = key
+            steps = 2 * max(abs(c1 - c0), abs(r1 - r0)) + 2
+            xs = (np.linspace(c0, c1, steps) + 0.5) * cs
+            ys = (np.linspace(r0, r1, steps) + 0.5) * cs - self.offset_y
+            index, inside = self.cells(xs, ys)
+            blocked = self.solid.ravel()[index] & inside
+            # The platform the origin stands on (the solid run in the row below it) doesn't
+            # count, or a shooter could never see down past its own footing
+            left, right = self.footing(c0 - self.x0 // cs, r0 + 1)
+            if left <= right:
+                row, col = np.divmod(index, self.cols)
+                blocked &= (row != r0 + 1) | (col < left) | (col > right)
+            clear = not np.any(blocked)
+            self.sight[key] = clear
+        return clear
+
+    def footing(self, col, row):
+        # Window columns [left, right] of the solid run in `row` that covers `col` (empty if none)
+        if not (0 <= row < self.rows and 0 <= col < self.cols and self.solid[row, col]):
+            return 0, -1
+        line = self.solid[row]
+        left = right = col
+        while left > 0 and line[left - 1]:
+            left -= 1
+        while right < self.cols - 1 and line[right + 1]:
+            right += 1
+        return left, right
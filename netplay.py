@@ -0,0 +1,378 @@
+import asyncio
+import socket
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from archetypes import WEAPONS
+from clock import FixedStepClock, TICK_RATE
+from world import World, BTN_CONFIRM, BTN_RIGHT, BTN_JUMP, BTN_FIRE, BTN_RESTART
+
+PORT = 7777
+
+# Messages are framed as (payload length, type). Clients only ever send their input mask;
+# the server answers with a view of the world every tick.
+MESSAGE = struct.Struct('<IB')
+MAX_MESSAGE = 1 << 20
+MSG_HELLO = 1  # client -> server: role byte, then the session name (UTF-8)
+MSG_INPUT = 2  # client -> server: input mask byte, held until the next MSG_INPUT
+MSG_VIEW = 3  # server -> client: zlib(view XOR the last view sent to that client)
+
+# Players' masks are OR'ed together into the session's one avatar (one can steer while
+# another shoots); spectators' input is ignored
+ROLE_PLAYER = 0
+ROLE_SPECTATOR = 1
+
+# A client whose socket has this much unsent data skips ticks until it drains
+SEND_BUFFER_LIMIT = 256 * 1024
+
+# View: what a client needs to draw the game. The header is followed by enemy x, y, color;
+# bullet x, y, size, color; hearts and upgrade items as (x, y, w, h, color) rows; and the
+# collected coins as sorted (x, y) rows. Coins are static level data the client regenerates
+# from level_seed, so only which ones are gone has to be sent.
+VIEW_HEADER = struct.Struct('<IIIfffiiiBiHHBB5iHHBBI')
+FLAG_STARTED = 1
+FLAG_PAUSED = 2
+FLAG_OVER = 4
+FLAG_CLEAR = 8
+COIN_SIZE = (8, 8, 10)  # w, h, color of every coin levelgen places
+
+
+def pack_message(kind, payload=b''):
+    return MESSAGE.pack(len(payload), kind) + payload
+
+
+async def read_message(reader):
+    length, kind = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+    if length > MAX_MESSAGE:
+        raise ConnectionError(f"message of {length} bytes is too long")
+    return kind, await reader.readexactly(length)
+
+
+def xor_delta(data, base):
+    # Byte-wise XOR against `base`, zero-extended or cut to len(data). Unchanged bytes come out
+    # as zeros, which is what makes the deltas compress; applying it again undoes it.
+    out = np.frombuffer(data, dtype=np.uint8).copy()
+    n = min(len(base), len(out))
+    out[:n] ^= np.frombuffer(base, dtype=np.uint8, count=n)
+    return out.tobytes()
+
+
+def encode_delta(view, base):
+    return zlib.compress(xor_delta(view, base), 1)
+
+
+def decode_delta(payload, base):
+    return xor_delta(zlib.decompress(payload), base)
+
+
+def encode_view(world):
+    e, ne = world.enemies, world.enemies.count
+    b, nb = world.bullets, world.bullets.count
+    coins = sorted(coin[:2] for coin in world.collected_coins)
+    flags = (FLAG_STARTED * world.game_started | FLAG_PAUSED * world.game_paused
+             | FLAG_OVER * world.game_over | FLAG_CLEAR * world.game_clear)
+    header = VIEW_HEADER.pack(
+        world.frame, world.level_seed, world.world_width, world.camera_x, world.player_x, world.player_y,
+        world.player_health, world.score, world.time_left, world.weapon, world.current_ammo,
+        world.charge_level, world.invincible_timer, world.weapon_selection, flags, *world.goal,
+        ne, nb, len(world.hearts), len(world.upgrade_items), len(coins),
+    )
+    return b''.join((
+        header,
+        e.x[:ne].astype(np.float32).tobytes(), e.y[:ne].astype(np.float32).tobytes(), e.color[:ne].tobytes(),
+        b.x[:nb].astype(np.float32).tobytes(), b.y[:nb].astype(np.float32).tobytes(),
+        b.size[:nb].astype(np.float32).tobytes(), b.color[:nb].tobytes(),
+        np.array(world.hearts.values(), dtype=np.float32).tobytes(),
+        np.array(world.upgrade_items.values(), dtype=np.float32).tobytes(),
+        np.array(coins, dtype=np.int32).tobytes(),
+    ))
+
+
+def _load_store(store, count, **values):
+    store.load(count, [values.get(name, 0) for name in store.columns])
+
+
+def _load_pool(pool, rows):
+    pool.clear()
+    for x, y, w, h, color in rows.tolist():
+        pool.spawn(x, y, int(w), int(h), int(color))
+
+
+def apply_view(world, view):
+    # Mirrors a view onto a World that is only drawn, never stepped. Terrain and coins come from
+    # the client's own chunk streaming at the server's camera position.
+    (world.frame, level_seed, world_width, world.camera_x, world.player_x, world.player_y,
+     world.player_health, world.score, time_left, world.weapon, ammo, world.charge_level, invincible,
+     world.weapon_selection, flags, *goal, enemies, bullets, hearts, items, coins) = VIEW_HEADER.unpack_from(view)
+    world.goal = tuple(goal)
+    world.time_up_at = world.tick + time_left
+    world.invincible_until = world.tick + invincible
+    setattr(world, WEAPONS[world.weapon].ammo_attr, ammo)
+    world.game_started = bool(flags & FLAG_STARTED)
+    world.game_paused = bool(flags & FLAG_PAUSED)
+    world.game_over = bool(flags & FLAG_OVER)
+    world.game_clear = bool(flags & FLAG_CLEAR)
+
+    offset = VIEW_HEADER.size
+    columns = []
+    for dtype, count in ((np.float32, enemies), (np.float32, enemies), (np.int8, enemies),
+                         (np.float32, bullets), (np.float32, bullets), (np.float32, bullets), (np.int8, bullets),
+                         (np.float32, hearts * 5), (np.float32, items * 5), (np.int32, coins * 2)):
+        columns.append(np.frombuffer(view, dtype=dtype, count=count, offset=offset))
+        offset += columns[-1].nbytes
+    ex, ey, ecolor, bx, by, bsize, bcolor, heart_rows, item_rows, coin_rows = columns
+
+    if (level_seed, world_width) != (world.level_seed, world.world_width):
+        world.level_seed = level_seed
+        world.world_width = world_width
+        world.open_level()
+        world.chunks = {}
+        world.chunk_window = None
+        world.collected_coins = set()
+        world.stage_grid.clear()
+        world.spike_grid.clear()
+        world.coin_grid.clear()
+    collected = {(x, y) + COIN_SIZE for x, y in coin_rows.reshape(-1, 2).tolist()}
+    coins_changed = collected != world.collected_coins
+    world.collected_coins = collected
+    if world.game_started:
+        # The mirrored enemies are replaced below; clearing first keeps chunk loads from mixing in
+        world.enemies.clear()
+        world.stream_level()
+        # Chunk loads queue shooter events this world never runs
+        world.events.clear()
+        if coins_changed:
+            world.reindex_level()
+
+    _load_store(world.enemies, enemies, x=ex, y=ey, color=ecolor)
+    _load_store(world.bullets, bullets, x=bx, y=by, size=bsize, color=bcolor)
+    _load_pool(world.hearts, heart_rows.reshape(-1, 5))
+    _load_pool(world.upgrade_items, item_rows.reshape(-1, 5))
+
+
+class Connection:
+    def __init__(self, writer, role):
+        self.writer = writer
+        self.role = role
+        self.inputs = 0
+        self.view = b''  # last view sent, which the next delta is taken against
+
+
+class Session:
+    # One authoritative World and everyone connected to it
+    def __init__(self, name, seed=None):
+        self.name = name
+        self.world = World(seed)
+        self.connections = []
+
+    def tick(self):
+        inputs = 0
+        for connection in self.connections:
+            if connection.role == ROLE_PLAYER:
+                inputs |= connection.inputs
+        self.world.step(inputs)
+
+        view = encode_view(self.world)
+        # Clients that were sent the same last view share one compressed delta
+        deltas = {}
+        for connection in self.connections:
+            if connection.writer.transport.get_write_buffer_size() > SEND_BUFFER_LIMIT:
+                continue
+            base = connection.view
+            message = deltas.get(id(base))
+            if message is None:
+                message = deltas[id(base)] = pack_message(MSG_VIEW, encode_delta(view, base))
+            connection.writer.write(message)
+            connection.view = view
+
+
+class Server:
+    # Hosts any number of sessions on one asyncio loop. A session starts when its first client
+    # says hello and ends when its last one leaves; all of them tick together.
+    def __init__(self, tick_rate=TICK_RATE, level_cache=None):
+        self.tick_rate = tick_rate
+        self.level_cache = level_cache
+        self.sessions = {}
+
+    async def serve(self, host='127.0.0.1', port=PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await self.run()
+
+    async def run(self):
+        clock = FixedStepClock(self.tick_rate)
+        while True:
+            for _ in range(clock.advance()):
+                for session in list(self.sessions.values()):
+                    session.tick()
+            await asyncio.sleep(clock.tick - clock.accumulator)
+
+    async def handle(self, reader, writer):
+        session = connection = None
+        try:
+            kind, payload = await read_message(reader)
+            if kind != MSG_HELLO or not payload:
+                return
+            writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            name = payload[1:].decode()
+            session = self.sessions.get(name)
+            if session is None:
+                session = self.sessions[name] = Session(name)
+                session.world.level_cache = self.level_cache
+            connection = Connection(writer, payload[0])
+            session.connections.append(connection)
+            while True:
+                kind, payload = await read_message(reader)
+                if kind == MSG_INPUT and payload:
+                    connection.inputs = payload[0]
+        except (asyncio.IncompleteReadError, ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            if connection is not None:
+                session.connections.remove(connection)
+                if not session.connections:
+                    del self.sessions[session.name]
+                    session.world.release_level()
+            writer.close()
+
+
+class Client:
+    # Connects to a server and mirrors its view onto a local World; poll() once per frame.
+    # Once the server goes away `closed` is set and the last view stays on screen.
+    def __init__(self, host, port=PORT, session='', role=ROLE_PLAYER):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(pack_message(MSG_HELLO, bytes([role]) + session.encode()))
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        self.outgoing = bytearray()
+        self.view = b''
+        self.inputs = None
+        self.closed = False
+
+    def send_input(self, inputs):
+        # Queued, then sent as far as the socket will take it: a server that stops reading
+        # must neither block the frame nor get half a message
+        if self.closed:
+            return
+        if inputs != self.inputs:
+            self.outgoing += pack_message(MSG_INPUT, bytes([inputs]))
+            self.inputs = inputs
+        try:
+            while self.outgoing:
+                del self.outgoing[:self.sock.send(self.outgoing)]
+        except BlockingIOError:
+            pass
+        except ConnectionError:
+            self.closed = True
+
+    def poll(self, world):
+        # Applies the newest complete view, if any arrived; returns whether one did
+        try:
+            while not self.closed:
+                data = self.sock.recv(1 << 16)
+                if not data:
+                    self.closed = True
+                self.buffer += data
+        except BlockingIOError:
+            pass
+        except ConnectionError:
+            # Reset by the server; whatever already arrived is still applied below
+            self.closed = True
+        updated = False
+        while len(self.buffer) >= MESSAGE.size:
+            length, kind = MESSAGE.unpack_from(self.buffer)
+            end = MESSAGE.size + length
+            if len(self.buffer) < end:
+                break
+            if kind == MSG_VIEW:
+                self.view = decode_delta(bytes(self.buffer[MESSAGE.size:end]), self.view)
+                updated = True
+            del self.buffer[:end]
+        if updated:
+            apply_view(world, self.view)
+        return updated
+
+    def close(self):
+        self.sock.close()
+
+
+def bot_inputs(world):
+    # Stand-in player: start, then run right jumping and firing; restart when the run ends
+    if not world.game_started:
+        return BTN_CONFIRM if world.frame % 2 else 0
+    if world.game_over or world.game_clear:
+        return BTN_RESTART if world.frame % 2 else 0
+    return BTN_RIGHT | BTN_FIRE | (BTN_JUMP if world.frame % 30 < 10 else 0)
+
+
+async def stand_in(port, session, role, until_frame):
+    # A headless client: mirrors every view it receives and, as a player, drives bot_inputs.
+    # Returns its final view and the bytes it received.
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(pack_message(MSG_HELLO, bytes([role]) + session.encode()))
+    world = World(seed=0)
+    view = b''
+    received = 0
+    inputs = None
+    while world.frame < until_frame:
+        kind, payload = await read_message(reader)
+        received += MESSAGE.size + len(payload)
+        if kind != MSG_VIEW:
+            continue
+        view = decode_delta(payload, view)
+        apply_view(world, view)
+        if role == ROLE_PLAYER and bot_inputs(world) != inputs:
+            inputs = bot_inputs(world)
+            writer.write(pack_message(MSG_INPUT, bytes([inputs])))
+    writer.close()
+    await writer.wait_closed()
+    return view, received
+
+
+async def localhost_check(sessions, clients, seconds):
+    server = Server()
+    listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    ticking = asyncio.ensure_future(server.run())
+    until_frame = int(seconds * TICK_RATE)
+    tasks = [
+        stand_in(port, f"session{s}", ROLE_PLAYER if c == 0 else ROLE_SPECTATOR, until_frame)
+        for s in range(sessions) for c in range(clients)
+    ]
+    start = time.perf_counter()
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    ticking.cancel()
+    listener.close()
+
+    for s in range(sessions):
+        views = [view for view, received in results[s * clients:(s + 1) * clients]]
+        frames = [VIEW_HEADER.unpack_from(view)[0] for view in views]
+        # Everyone who stopped on the same frame must have rebuilt the same bytes
+        by_frame = {}
+        for frame, view in zip(frames, views):
+            by_frame.setdefault(frame, set()).add(view)
+        assert all(len(same) == 1 for same in by_frame.values()), f"session{s}: clients disagree"
+    received = sum(received for view, received in results)
+    last = max(len(view) for view, received in results)
+    print(f"{sessions} sessions x {clients} clients, {until_frame} ticks in {elapsed:.2f}s: "
+          f"{received / len(results) / until_frame:.0f} bytes/tick per client (full view {last} bytes)")
+
+
+if __name__ == '__main__':
+    # python netplay.py serve [PORT]             host sessions on localhost
+    # python netplay.py check [SESSIONS] [CLIENTS] [SECONDS]
+    #                                            run stand-in clients against an in-process server
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        args = [float(arg) for arg in sys.argv[2:5]]
+        defaults = [4, 3, 10]
+        sessions, clients, seconds = args + defaults[len(args):]
+        asyncio.run(localhost_check(int(sessions), int(clients), seconds))
+    else:
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+        asyncio.run(Server().serve(port=port))
@@ -0,0 +1,90 @@
+import csv
+import json
+import time
+from collections import deque
+
+PHASES = ('update_player', 'update_enemies', 'update_bullets', 'check_collisions', 'update_camera', 'draw')
+# Frames of trace kept for export; older ones are dropped so a long session stays bounded
+TRACE_FRAMES = 60 * 60
+
+
+class FrameProfiler:
+    # Times named methods on any object by shadowing them with instance attributes,
+    # so nothing is measured (or slowed down) until attach() is called.
+    def __init__(self, window=600, budget=1 / 60, keep_trace=True, trace_frames=TRACE_FRAMES):
+        self.budget = budget
+        self.records = deque(maxlen=window)
+        self.trace = deque(maxlen=trace_frames) if keep_trace else None
+        self.frames = 0
+        self.dropped = 0
+        self.phases = {}
+        self.frame_start = None
+        self.attached = []
+
+    def attach(self, target, names=PHASES):
+        for name in names:
+            if hasattr(target, name):
+                setattr(target, name, self._timed(name, getattr(target, name)))
+                self.attached.append((target, name))
+
+    def detach(self):
+        for target, name in self.attached:
+            delattr(target, name)
+        self.attached = []
+
+    def _timed(self, name, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+        return timed
+
+    def begin_frame(self):
+        self.phases = {}
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self, world):
+        total = time.perf_counter() - self.frame_start
+        self.frames += 1
+        if total > self.budget:
+            self.dropped += 1
+        record = {'frame': world.frame, 'total_ms': total * 1000}
+        for name in PHASES:
+            record[name + '_ms'] = self.phases.get(name, 0.0) * 1000
+        record['enemies'] = len(world.enemies)
+        record['bullets'] = len(world.bullets)
+        record['coins'] = len(world.coins)
+        self.records.append(record)
+        if self.trace is not None:
+            self.trace.append(record)
+
+    def stats(self):
+        if not self.records:
+            return None
+        totals = sorted(record['total_ms'] for record in self.records)
+        last = self.records[-1]
+        stats = {
+            'p50_ms': totals[len(totals) // 2],
+            'p99_ms': totals[min(len(totals) - 1, len(totals) * 99 // 100)],
+            'dropped': self.dropped,
+            'frames': self.frames,
+            'enemies': last['enemies'],
+            'bullets': last['bullets'],
+            'coins': last['coins'],
+        }
+        for name in PHASES:
+            stats[name + '_ms'] = sum(record[name + '_ms'] for record in self.records) / len(self.records)
+        return stats
+
+    def export(self, path):
+        records = list(self.trace if self.trace is not None else self.records)
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(records[0]) if records else ['frame'])
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            with open(path, 'w') as f:
+                json.dump({'budget_ms': self.budget * 1000, 'summary': self.stats(), 'records': records}, f)
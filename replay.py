@@ -0,0 +1,100 @@
+import struct
+import sys
+import time
+
+from world import World
+
+# Replay file: header, then (varint run length, u8 input mask) pairs
+MAGIC = b'CXRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBQI16s')  # magic, version, seed, frame count, final state hash
+
+
+class Replay:
+    def __init__(self, seed, runs=None, final_hash=b''):
+        self.seed = seed
+        self.runs = runs if runs is not None else []  # [run_length, mask]
+        self.final_hash = final_hash
+
+    @property
+    def frames(self):
+        return sum(length for length, _ in self.runs)
+
+    def record(self, mask):
+        if self.runs and self.runs[-1][1] == mask:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, mask])
+
+    def inputs(self):
+        for length, mask in self.runs:
+            for _ in range(length):
+                yield mask
+
+    def encode(self):
+        body = bytearray()
+        for length, mask in self.runs:
+            while length >= 0x80:
+                body.append((length & 0x7F) | 0x80)
+                length >>= 7
+            body.append(length)
+            body.append(mask)
+        return HEADER.pack(MAGIC, VERSION, self.seed, self.frames, self.final_hash) + bytes(body)
+
+    @classmethod
+    def decode(cls, data):
+        magic, version, seed, frames, final_hash = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a replay file (or unsupported version)")
+        runs = []
+        pos = HEADER.size
+        while pos < len(data):
+            length = shift = 0
+            while True:
+                byte = data[pos]
+                pos += 1
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            runs.append([length, data[pos]])
+            pos += 1
+        replay = cls(seed, runs, final_hash)
+        if replay.frames != frames:
+            raise ValueError("truncated replay file")
+        return replay
+
+    def save(self, path, world=None):
+        if world is not None:
+            self.final_hash = world.state_hash()
+        with open(path, 'wb') as f:
+            f.write(self.encode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.decode(f.read())
+
+
+def simulate(replay):
+    world = World(seed=replay.seed)
+    for mask in replay.inputs():
+        world.step(mask)
+    return world
+
+
+def verify(replay):
+    return simulate(replay).state_hash() == replay.final_hash
+
+
+if __name__ == '__main__':
+    failed = 0
+    for path in sys.argv[1:]:
+        replay = Replay.load(path)
+        start = time.perf_counter()
+        ok = verify(replay)
+        elapsed = time.perf_counter() - start
+        failed += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {path}: {replay.frames} frames in {elapsed:.2f}s "
+              f"({replay.frames / 60 / max(elapsed, 1e-9):.0f}x real time)")
+    sys.exit(1 if failed else 0)
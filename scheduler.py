@@ -0,0 +1,31 @@
+import heapq
+
+
+class Scheduler:
+    # Min-heap of (tick, seq, kind, payload). seq breaks ties so events due on the same tick
+    # fire in the order they were scheduled, which keeps runs deterministic.
+    def __init__(self):
+        self.queue = []
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def schedule(self, tick, kind, payload=0):
+        heapq.heappush(self.queue, (tick, self.seq, kind, payload))
+        self.seq += 1
+
+    def pop_due(self, tick):
+        # Yields (tick, kind, payload) for every event due at or before `tick`
+        queue = self.queue
+        while queue and queue[0][0] <= tick:
+            due, seq, kind, payload = heapq.heappop(queue)
+            yield due, kind, payload
+
+    def load(self, queue, seq):
+        # `queue` must be a heap, e.g. one copied out of another Scheduler
+        self.queue = list(queue)
+        self.seq = seq
+
+    def clear(self):
+        self.queue.clear()
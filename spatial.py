@@ -0,0 +1,33 @@
+class SpatialGrid:
+    # Uniform-grid bucket index for rectangles; query() returns candidates for a narrow-phase test
+    def __init__(self, cell_size=32):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        self.cells.clear()
+
+    def _keys(self, x, y, w, h):
+        cs = self.cell_size
+        for cx in range(int(x // cs), int((x + w) // cs) + 1):
+            for cy in range(int(y // cs), int((y + h) // cs) + 1):
+                yield cx, cy
+
+    def insert(self, item, x, y, w, h):
+        for key in self._keys(x, y, w, h):
+            self.cells.setdefault(key, []).append(item)
+
+    def remove(self, item, x, y, w, h):
+        for key in self._keys(x, y, w, h):
+            bucket = self.cells.get(key)
+            if bucket is not None and item in bucket:
+                bucket.remove(item)
+                if not bucket:
+                    del self.cells[key]
+
+    def query(self, x, y, w, h):
+        found = {}
+        for key in self._keys(x, y, w, h):
+            for item in self.cells.get(key, ()):
+                found[id(item)] = item
+        return list(found.values())
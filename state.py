@@ -0,0 +1,175 @@
+import struct
+
+import numpy as np
+
+from archetypes import WEAPONS
+from entities import ENEMY_COLUMNS, BULLET_COLUMNS
+
+# Plain attributes of World copied by value into a snapshot
+SCALAR_FIELDS = (
+    'world_width', 'camera_x', 'frame', 'seed', 'inputs', 'prev_inputs', 'pressed', 'released',
+    'player_start_x', 'player_x', 'player_y', 'player_vy', 'player_health', 'jumps_left',
+    'tick', 'invincible_until', 'shoot_ready_at', 'player_direction', 'enemy_safe_zone',
+    'weapon', 'charge_level', 'enemy_kill_count', 'game_paused', 'weapon_selection', 'enemy_spawn_interval',
+    'shooter_interval', 'distance_moved', 'last_player_x', 'collected_coins_for_heart', 'goal',
+    'max_enemies', 'spawn_at', 'score', 'level_seed', 'chunk_window', 'game_started',
+    'level_initialized', 'time_up_at', 'game_over', 'game_clear', 'protection_until', 'flow_key',
+) + tuple(name for weapon in WEAPONS for name in (weapon.ammo_attr, weapon.max_ammo_attr, weapon.cooldown_attr))
+RNG_FIELDS = ('level_rng', 'spawn_rng', 'ai_rng')
+
+MAGIC = b'CXST'
+VERSION = 4
+MT_STATE = struct.Struct('<625I')
+
+
+def _pack(out, value):
+    # Tagged encoding for the handful of scalar types World uses
+    if value is None:
+        out += b'n'
+    elif isinstance(value, bool):
+        out += b't' if value else b'f'
+    elif isinstance(value, int):
+        out += b'i' + struct.pack('<q', value)
+    elif isinstance(value, float):
+        out += b'd' + struct.pack('<d', value)
+    elif isinstance(value, str):
+        data = value.encode()
+        out += b's' + struct.pack('<H', len(data)) + data
+    elif isinstance(value, tuple):
+        out += b'T' + struct.pack('<I', len(value))
+        for item in value:
+            _pack(out, item)
+    else:
+        raise TypeError(f"cannot encode {type(value).__name__}")
+
+
+def _unpack(data, pos):
+    tag = data[pos:pos + 1]
+    pos += 1
+    if tag == b'n':
+        return None, pos
+    if tag in (b't', b'f'):
+        return tag == b't', pos
+    if tag == b'i':
+        return struct.unpack_from('<q', data, pos)[0], pos + 8
+    if tag == b'd':
+        return struct.unpack_from('<d', data, pos)[0], pos + 8
+    if tag == b's':
+        size = struct.unpack_from('<H', data, pos)[0]
+        pos += 2
+        return data[pos:pos + size].decode(), pos + size
+    if tag == b'T':
+        size = struct.unpack_from('<I', data, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(size):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return tuple(items), pos
+    raise ValueError(f"bad tag {tag!r} at offset {pos - 1}")
+
+
+class GameState:
+    # Immutable once captured. Level chunks are shared with the world that produced them
+    # (they are never modified after generation), so a snapshot never copies the level.
+    def __init__(self, scalars, entities, upgrade_items, hearts, rng_states,
+                 chunk_indices, collected_coins, killed_enemies, events, chunks=None):
+        self.scalars = scalars
+        self.entities = entities  # ((count, next_uid, (column, ...)), ...) for enemies, bullets
+        self.upgrade_items = upgrade_items
+        self.hearts = hearts
+        self.rng_states = rng_states
+        self.chunk_indices = chunk_indices
+        self.collected_coins = collected_coins
+        self.killed_enemies = killed_enemies
+        self.events = events  # (heap of (tick, seq, kind, payload), next seq)
+        self.chunks = chunks
+
+    @classmethod
+    def capture(cls, world):
+        entities = tuple(
+            (store.count, store.next_uid,
+             tuple(getattr(store, name)[:store.count].copy() for name in store.columns))
+            for store in (world.enemies, world.bullets)
+        )
+        return cls(
+            tuple(getattr(world, name) for name in SCALAR_FIELDS),
+            entities,
+            world.upgrade_items.values(),
+            world.hearts.values(),
+            tuple(getattr(world, name).getstate() for name in RNG_FIELDS),
+            tuple(sorted(world.chunks)),
+            frozenset(world.collected_coins),
+            frozenset(world.killed_enemies),
+            (tuple(world.events.queue), world.events.seq),
+            dict(world.chunks),
+        )
+
+    def restore(self, world):
+        for name, value in zip(SCALAR_FIELDS, self.scalars):
+            setattr(world, name, value)
+        for store, (count, next_uid, columns) in zip((world.enemies, world.bullets), self.entities):
+            store.load(count, columns, next_uid)
+        for pool, values in ((world.upgrade_items, self.upgrade_items), (world.hearts, self.hearts)):
+            pool.clear()
+            for value in values:
+                pool.spawn(*value)
+        for name, rng_state in zip(RNG_FIELDS, self.rng_states):
+            getattr(world, name).setstate(rng_state)
+        world.collected_coins = set(self.collected_coins)
+        world.killed_enemies = set(self.killed_enemies)
+        world.events.load(*self.events)
+        world.open_level()
+        if self.chunks is None:
+            # Decoded states only carry chunk indices; rebuild those chunks from the level seed
+            self.chunks = {index: world.make_chunk(index) for index in self.chunk_indices}
+        world.chunks = dict(self.chunks)
+        world.reindex_level()
+
+    def encode(self):
+        out = bytearray(MAGIC) + bytes([VERSION])
+        _pack(out, self.scalars)
+        for count, next_uid, columns in self.entities:
+            out += struct.pack('<IQ', count, next_uid)
+            for column in columns:
+                out += column.tobytes()
+        _pack(out, self.upgrade_items)
+        _pack(out, self.hearts)
+        for version, words, gauss_next in self.rng_states:
+            out += MT_STATE.pack(*words)
+            _pack(out, gauss_next)
+        _pack(out, self.chunk_indices)
+        _pack(out, tuple(sorted(self.collected_coins)))
+        _pack(out, tuple(sorted(self.killed_enemies)))
+        _pack(out, self.events)
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        if data[:4] != MAGIC or data[4] != VERSION:
+            raise ValueError("not a game state (or unsupported version)")
+        scalars, pos = _unpack(data, 5)
+        entities = []
+        for spec in (ENEMY_COLUMNS, BULLET_COLUMNS):
+            count, next_uid = struct.unpack_from('<IQ', data, pos)
+            pos += 12
+            columns = []
+            for dtype in spec.values():
+                size = count * np.dtype(dtype).itemsize
+                columns.append(np.frombuffer(data, dtype=dtype, count=count, offset=pos).copy())
+                pos += size
+            entities.append((count, next_uid, tuple(columns)))
+        upgrade_items, pos = _unpack(data, pos)
+        hearts, pos = _unpack(data, pos)
+        rng_states = []
+        for _ in RNG_FIELDS:
+            words = MT_STATE.unpack_from(data, pos)
+            pos += MT_STATE.size
+            gauss_next, pos = _unpack(data, pos)
+            rng_states.append((3, words, gauss_next))
+        chunk_indices, pos = _unpack(data, pos)
+        collected_coins, pos = _unpack(data, pos)
+        killed_enemies, pos = _unpack(data, pos)
+        events, pos = _unpack(data, pos)
+        return cls(scalars, tuple(entities), upgrade_items, hearts, tuple(rng_states),
+                   chunk_indices, frozenset(collected_coins), frozenset(killed_enemies), events)
@@ -0,0 +1,166 @@
+import atexit
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from archetypes import ENEMY_KINDS, WEAPONS
+
+# Telemetry file: header, then fixed-size event records appended in batches. A record cut off
+# by a crash is ignored on read, so the file never needs repairing.
+MAGIC = b'CXTM'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+RECORD = np.dtype([
+    ('time', '<f8'), ('seed', '<u4'), ('level', '<u4'), ('tick', '<u4'),
+    ('kind', 'u1'), ('weapon', 'u1'), ('a', '<i4'), ('b', '<i4'),
+])
+
+# Event kinds, with what a and b hold. A run is identified by (seed, level).
+LOG_RUN_START = 0  # -
+LOG_KILL = 1  # enemy kind, score after
+LOG_WEAPON = 2  # -, - (the record's weapon is the one picked from the upgrade menu)
+LOG_GAME_OVER = 3  # score, enemies killed
+LOG_CLEAR = 4  # score, enemies killed
+LOG_NAMES = ('run start', 'kill', 'weapon', 'game over', 'clear')
+
+# Events waiting for the writer beyond this are dropped (and counted) rather than blocking
+QUEUE_CAPACITY = 4096
+BATCH_SIZE = 512
+HIGH_SCORES = 10
+
+
+def load_high_scores(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+class TelemetryWriter:
+    # record() is called from the game loop and only ever does a non-blocking put. A daemon
+    # thread drains the queue, appends each batch to the file and keeps the high-score table.
+    def __init__(self, path, high_score_path=None, capacity=QUEUE_CAPACITY):
+        self.path = path
+        self.high_score_path = high_score_path
+        self.high_scores = load_high_scores(high_score_path) if high_score_path else []
+        self.best = self.high_scores[0]['score'] if self.high_scores else 0
+        self.dropped = 0
+        self.queue = queue.Queue(capacity)
+        self.run_starts = {}  # (seed, level) -> tick, touched only by the writer thread
+        self.thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def record(self, world, kind, a=0, b=0):
+        try:
+            self.queue.put_nowait((time.time(), world.seed, world.level_seed, world.tick, kind, world.weapon, a, b))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def _run(self):
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(HEADER.pack(MAGIC, VERSION))
+            done = False
+            while not done:
+                batch = [self.queue.get()]
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    done = True
+                    batch = batch[:batch.index(None)]
+                if batch:
+                    f.write(np.array(batch, dtype=RECORD).tobytes())
+                    f.flush()
+                    self._update_high_scores(batch)
+
+    def _update_high_scores(self, batch):
+        changed = False
+        for when, seed, level, tick, kind, weapon, a, b in batch:
+            if kind == LOG_RUN_START:
+                self.run_starts[seed, level] = tick
+            elif kind in (LOG_GAME_OVER, LOG_CLEAR):
+                start = self.run_starts.pop((seed, level), tick)
+                self.high_scores.append(dict(
+                    score=a, kills=b, cleared=kind == LOG_CLEAR, seconds=round((tick - start) / 60, 2),
+                    weapon=WEAPONS[weapon].name, date=time.strftime('%Y-%m-%d %H:%M', time.localtime(when)),
+                ))
+                changed = True
+        if not changed:
+            return
+        self.high_scores.sort(key=lambda entry: -entry['score'])
+        del self.high_scores[HIGH_SCORES:]
+        self.best = self.high_scores[0]['score']
+        if self.high_score_path:
+            partial = self.high_score_path + '.partial'
+            with open(partial, 'w') as f:
+                json.dump(self.high_scores, f, indent=1)
+            os.replace(partial, self.high_score_path)
+
+
+def read_events(path):
+    # Every complete record in a telemetry file, as one structured array
+    with open(path, 'rb') as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a telemetry file (or unsupported version)")
+        count = (os.fstat(f.fileno()).st_size - HEADER.size) // RECORD.itemsize
+        return np.fromfile(f, dtype=RECORD, count=count)
+
+
+def summarize(events):
+    # Column-wise bincounts and sorts only; nothing loops over events in Python
+    kind = events['kind']
+    counts = np.bincount(kind, minlength=len(LOG_NAMES))
+    kills = np.flatnonzero(kind == LOG_KILL)
+    ends = np.flatnonzero(kind >= LOG_GAME_OVER)
+    starts = np.flatnonzero(kind == LOG_RUN_START)
+    clears = np.flatnonzero(kind == LOG_CLEAR)
+    weapon = events['weapon']
+    a = events['a']
+
+    # Clear times: match each clear to its run's start by (seed, level)
+    seconds = np.zeros(0)
+    if len(starts) and len(clears):
+        keys = events['seed'].astype(np.uint64) << np.uint64(32) | events['level']
+        tick = events['tick'].astype(np.int64)
+        starts = starts[np.argsort(keys[starts], kind='stable')]
+        clears = clears[np.argsort(keys[clears], kind='stable')]
+        found = starts[np.minimum(np.searchsorted(keys[starts], keys[clears]), len(starts) - 1)]
+        matched = keys[found] == keys[clears]
+        seconds = (tick[clears[matched]] - tick[found[matched]]) / 60
+
+    lines = [f"{len(events)} events, {counts[LOG_RUN_START]} runs, "
+             f"{counts[LOG_GAME_OVER]} deaths, {counts[LOG_CLEAR]} clears"]
+    if len(ends):
+        lines.append(f"score: best {a[ends].max()}, mean {a[ends].mean():.0f}; "
+                     f"kills per run {events['b'][ends].mean():.1f}")
+    if len(seconds):
+        lines.append(f"clear time: best {seconds.min():.1f}s, median {np.median(seconds):.1f}s")
+    by_kind = np.bincount(a[kills], minlength=len(ENEMY_KINDS))
+    lines.append("kills: " + ", ".join(f"{k.name} {n}" for k, n in zip(ENEMY_KINDS, by_kind.tolist())))
+    picks = np.bincount(weapon[kind == LOG_WEAPON], minlength=len(WEAPONS))
+    lines.append("weapon picks: " + ", ".join(f"{w.name} {n}" for w, n in zip(WEAPONS, picks.tolist())))
+    by_weapon = np.bincount(weapon[kills], minlength=len(WEAPONS))
+    lines.append("kills by weapon: " + ", ".join(f"{w.name} {n}" for w, n in zip(WEAPONS, by_weapon.tolist())))
+    return "\n".join(lines)
+
+if __name__ == '__main__':
+    # Offline report: python telemetry.py TELEMETRY_FILE [...]
+    events = np.concatenate([read_events(path) for path in sys.argv[1:]])
+    print(summarize(events))
@@ -0,0 +1,253 @@
+import multiprocessing as mp
+import random
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from archetypes import WEAPONS
+from entities import OWNER_ENEMY
+from world import World, SCREEN_WIDTH, SCREEN_HEIGHT, BTN_CONFIRM, BTN_RIGHT, BTN_JUMP, BTN_FIRE
+
+# Observation row: player features, then the nearest enemies and enemy bullets by x distance
+NEAREST_ENEMIES = 8
+NEAREST_BULLETS = 4
+OBS_PLAYER = 10
+OBS_SIZE = OBS_PLAYER + NEAREST_ENEMIES * 3 + NEAREST_BULLETS * 2
+
+HIT_PENALTY = 50
+CLEAR_BONUS = 1000
+
+
+def observe(world, out):
+    out[:] = 0
+    out[0] = world.player_x / world.world_width
+    out[1] = world.player_y / SCREEN_HEIGHT
+    out[2] = world.player_vy
+    out[3] = world.player_health
+    out[4] = world.current_ammo
+    out[5] = world.weapon
+    out[6] = world.charge_level / max(WEAPONS[world.weapon].charge_time, 1)
+    out[7] = world.invincible_timer > 0
+    out[8] = world.time_left / (180 * 60)
+    out[9] = world.game_paused
+
+    pos = OBS_PLAYER
+    enemies = world.enemies
+    n = enemies.count
+    dx = enemies.x[:n] - world.player_x
+    nearest = np.argsort(np.abs(dx), kind='stable')[:NEAREST_ENEMIES]
+    rows = out[pos:pos + NEAREST_ENEMIES * 3].reshape(NEAREST_ENEMIES, 3)
+    rows[:len(nearest), 0] = dx[nearest] / SCREEN_WIDTH
+    rows[:len(nearest), 1] = (enemies.y[:n][nearest] - world.player_y) / SCREEN_HEIGHT
+    rows[:len(nearest), 2] = enemies.kind[:n][nearest] + 1  # 0 marks an empty slot
+
+    pos += NEAREST_ENEMIES * 3
+    bullets = world.bullets
+    n = bullets.count
+    hostile = np.flatnonzero(bullets.owner[:n] == OWNER_ENEMY)
+    dx = bullets.x[:n][hostile] - world.player_x
+    nearest = hostile[np.argsort(np.abs(dx), kind='stable')[:NEAREST_BULLETS]]
+    rows = out[pos:pos + NEAREST_BULLETS * 2].reshape(NEAREST_BULLETS, 2)
+    rows[:len(nearest), 0] = (bullets.x[:n][nearest] - world.player_x) / SCREEN_WIDTH
+    rows[:len(nearest), 1] = (bullets.y[:n][nearest] - world.player_y) / SCREEN_HEIGHT
+
+
+class GameEnv:
+    # One World that restarts itself with a fresh seed when an episode ends. The upgrade menu
+    # waits for a confirm press, so unless upgrade_pick is None the env answers it itself with
+    # that index into UPGRADE_WEAPONS; otherwise a policy that never confirms would stall.
+    def __init__(self, seed, config=None, frames_per_step=1, upgrade_pick=0):
+        self.seeds = random.Random(seed)
+        self.config = dict(config or {})
+        self.frames_per_step = frames_per_step
+        self.upgrade_pick = upgrade_pick
+        self.world = None
+        self.episodes = []
+        self.reset()
+
+    def reset(self):
+        self.world = World(seed=self.seeds.getrandbits(32))
+        for name, value in self.config.items():
+            setattr(self.world, name, value)
+        self.world.step(BTN_CONFIRM)
+        self.start_frame = self.world.frame
+
+    def step(self, action):
+        world = self.world
+        score = world.score
+        health = world.player_health
+        for _ in range(self.frames_per_step):
+            world.step(action)
+            if world.game_paused and self.upgrade_pick is not None:
+                world.weapon_selection = self.upgrade_pick
+                world.step(0)
+                world.step(BTN_CONFIRM)
+            if world.game_over or world.game_clear:
+                break
+        reward = world.score - score - HIT_PENALTY * max(health - world.player_health, 0)
+        done = world.game_over or world.game_clear
+        if done:
+            reward += CLEAR_BONUS * world.game_clear
+            self.episodes.append({
+                'seed': world.seed, 'score': world.score, 'frames': world.frame - self.start_frame,
+                'clear': world.game_clear, 'kills': world.enemy_kill_count, 'weapon': world.weapon_type,
+            })
+            self.reset()
+        return reward, done
+
+
+class VecEnv:
+    # Steps N GameEnvs in lock-step, writing into caller-provided (possibly shared) arrays
+    def __init__(self, num_envs, seed=0, config=None, frames_per_step=1, first_index=0, buffers=None,
+                 upgrade_pick=0):
+        self.envs = [GameEnv(seed * 1000003 + first_index + i, config, frames_per_step, upgrade_pick)
+                     for i in range(num_envs)]
+        if buffers is None:
+            buffers = {name: np.zeros((num_envs,) + shape, dtype=dtype)
+                       for name, (dtype, shape) in BUFFER_SPECS.items()}
+        self.obs = buffers['obs']
+        self.rewards = buffers['rewards']
+        self.dones = buffers['dones']
+        self.actions = buffers['actions']
+        self.observe_all()
+
+    def __len__(self):
+        return len(self.envs)
+
+    def observe_all(self):
+        for env, row in zip(self.envs, self.obs):
+            observe(env.world, row)
+
+    def step(self, actions=None):
+        if actions is not None:
+            self.actions[:] = actions
+        for i, (env, action) in enumerate(zip(self.envs, self.actions.tolist())):
+            self.rewards[i], self.dones[i] = env.step(action)
+        self.observe_all()
+        return self.obs, self.rewards, self.dones
+
+    def pop_episodes(self):
+        episodes = [episode for env in self.envs for episode in env.episodes]
+        for env in self.envs:
+            env.episodes = []
+        return episodes
+
+    def close(self):
+        pass
+
+
+BUFFER_SPECS = {
+    'obs': (np.float32, (OBS_SIZE,)),
+    'rewards': (np.float32, ()),
+    'dones': (np.bool_, ()),
+    'actions': (np.uint8, ()),
+}
+
+
+def _worker(conn, shm_names, num_envs, start, stop, seed, config, frames_per_step, upgrade_pick):
+    blocks = {name: shared_memory.SharedMemory(name=shm_name) for name, shm_name in shm_names.items()}
+    arrays = {}
+    for name, (dtype, shape) in BUFFER_SPECS.items():
+        full = np.ndarray((num_envs,) + shape, dtype=dtype, buffer=blocks[name].buf)
+        arrays[name] = full[start:stop]
+    envs = VecEnv(stop - start, seed, config, frames_per_step, first_index=start, buffers=arrays,
+                  upgrade_pick=upgrade_pick)
+    conn.send(True)
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'step':
+                envs.step()
+                conn.send(True)
+            elif command == 'episodes':
+                conn.send(envs.pop_episodes())
+            else:
+                break
+    finally:
+        # Views into the shared blocks must go before the blocks can be closed
+        envs = arrays = full = None
+        for block in blocks.values():
+            block.close()
+
+
+class ProcessVecEnv:
+    # Same interface as VecEnv, with the envs sharded across worker processes. Observations,
+    # rewards, dones and actions live in shared memory, so each step only sends a short command.
+    def __init__(self, num_envs, seed=0, config=None, frames_per_step=1, workers=None, upgrade_pick=0):
+        workers = min(workers or mp.cpu_count(), num_envs)
+        self.num_envs = num_envs
+        self.blocks = {}
+        for name, (dtype, shape) in BUFFER_SPECS.items():
+            size = max(num_envs * int(np.prod(shape, dtype=int)) * np.dtype(dtype).itemsize, 1)
+            self.blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+        arrays = {name: np.ndarray((num_envs,) + shape, dtype=dtype, buffer=self.blocks[name].buf)
+                  for name, (dtype, shape) in BUFFER_SPECS.items()}
+        self.obs = arrays['obs']
+        self.rewards = arrays['rewards']
+        self.dones = arrays['dones']
+        self.actions = arrays['actions']
+
+        shm_names = {name: block.name for name, block in self.blocks.items()}
+        bounds = np.linspace(0, num_envs, workers + 1).astype(int)
+        self.conns = []
+        self.processes = []
+        for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            parent, child = mp.Pipe()
+            process = mp.Process(target=_worker, daemon=True, args=(
+                child, shm_names, num_envs, start, stop, seed, config, frames_per_step, upgrade_pick))
+            process.start()
+            self.conns.append(parent)
+            self.processes.append(process)
+        for conn in self.conns:
+            conn.recv()
+
+    def __len__(self):
+        return self.num_envs
+
+    def step(self, actions=None):
+        if actions is not None:
+            self.actions[:] = actions
+        for conn in self.conns:
+            conn.send('step')
+        for conn in self.conns:
+            conn.recv()
+        return self.obs, self.rewards, self.dones
+
+    def pop_episodes(self):
+        for conn in self.conns:
+            conn.send('episodes')
+        return [episode for conn in self.conns for episode in conn.recv()]
+
+    def close(self):
+        for conn in self.conns:
+            conn.send('close')
+        for process in self.processes:
+            process.join()
+        self.obs = self.rewards = self.dones = self.actions = None
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    # Throughput check: python vecenv.py [num_envs] [steps]
+    num_envs = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    policy = np.random.default_rng(0)
+    choices = np.array([BTN_RIGHT, BTN_RIGHT | BTN_FIRE, BTN_RIGHT | BTN_JUMP, 0], dtype=np.uint8)
+    with ProcessVecEnv(num_envs) as envs:
+        start = time.perf_counter()
+        for _ in range(steps):
+            envs.step(policy.choice(choices, num_envs))
+        elapsed = time.perf_counter() - start
+        episodes = envs.pop_episodes()
+    print(f"{num_envs * steps / elapsed:.0f} frames/s over {num_envs} envs, {len(episodes)} episodes finished")
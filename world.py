@@ -0,0 +1,685 @@
+import hashlib
+import random
+
+import numpy as np
+
+from archetypes import ENEMY_KINDS, SPAWN_KINDS, WEAPONS, WEAPON_IDS, UPGRADE_WEAPONS, WEAPON_NORMAL
+from navigation import NavGrid, NAV_CELL, NAV_MARGIN, FLOW_FIELD_INTERVAL
+from scheduler import Scheduler
+from telemetry import LOG_RUN_START, LOG_KILL, LOG_WEAPON, LOG_GAME_OVER, LOG_CLEAR
+from spatial import SpatialGrid
+from state import GameState
+from levelgen import CHUNK_WIDTH, chunk_count, generate_chunk
+from entities import EntityStore, PickupPool, ENEMY_COLUMNS, BULLET_COLUMNS, ENEMY_CAPACITY, BULLET_CAPACITY, OWNER_PLAYER, OWNER_ENEMY, ORIGIN_STRIDE
+
+SCREEN_WIDTH = 160
+SCREEN_HEIGHT = 160
+
+# Per-frame input bitmask (buttons held this frame)
+BTN_LEFT = 1 << 0
+BTN_RIGHT = 1 << 1
+BTN_JUMP = 1 << 2
+BTN_FIRE = 1 << 3
+BTN_UP = 1 << 4
+BTN_DOWN = 1 << 5
+BTN_CONFIRM = 1 << 6
+BTN_RESTART = 1 << 7
+
+# Chunks within this distance of the viewport are kept generated
+CHUNK_LOAD_MARGIN = 64
+
+# Scheduled event kinds; EVENT_SHOOT carries the shooter's uid as payload
+EVENT_SPAWN = 0
+EVENT_SHOOT = 1
+EVENT_TIME_UP = 2
+
+SHOOTER_RANGE = 120
+PLAYER_SPEED = 2
+
+
+class World:
+    def __init__(self, seed=None):
+        # World settings
+        self.world_width = 2048
+        self.camera_x = 0
+        self.frame = 0
+
+        # Gameplay ticks, which stand still while paused or in menus. Timers are stored as the
+        # tick they run out on, and timed events wait in the scheduler, so nothing counts down.
+        self.tick = 0
+        self.events = Scheduler()
+        self.invincible_until = 0
+        self.shoot_ready_at = 0
+        self.spawn_at = 0
+        self.time_up_at = 0
+        self.protection_until = 0
+
+        # One RNG stream per subsystem, so e.g. a level tweak doesn't shift spawn rolls
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.level_rng = random.Random(f"{self.seed}/level")
+        self.spawn_rng = random.Random(f"{self.seed}/spawn")
+        self.ai_rng = random.Random(f"{self.seed}/ai")
+
+        # Input edges, derived from the previous frame's mask like pyxel.btnp/btnr
+        self.inputs = 0
+        self.prev_inputs = 0
+        self.pressed = 0
+        self.released = 0
+
+        # Player
+        self.player_start_x = 20
+        self.player_x = self.player_start_x
+        self.player_y = 120
+        self.player_vy = 0
+        self.player_health = 3
+        self.jumps_left = 2
+        self.invincible_timer = 0
+        self.player_shoot_cooldown = 0
+        self.player_direction = 1
+        self.enemy_safe_zone = self.player_start_x + (4 * 8)
+
+        # Weapon
+        self.weapon = WEAPON_NORMAL
+        self.charge_level = 0
+        self.enemy_kill_count = 0
+        self.upgrade_items = PickupPool()
+        self.game_paused = False
+        self.weapon_selection = 0
+
+        # Ammo: normal_ammo, max_normal_ammo, normal_cooldown and so on for every weapon
+        for weapon in WEAPONS:
+            setattr(self, weapon.ammo_attr, weapon.ammo)
+            setattr(self, weapon.max_ammo_attr, weapon.ammo)
+            setattr(self, weapon.cooldown_attr, weapon.cooldown)
+        self.distance_moved = 0
+        self.last_player_x = self.player_x
+
+        # Health Recovery
+        self.collected_coins_for_heart = 0
+        self.hearts = PickupPool()
+
+        # Game Elements
+        self.stage = []
+        self.spikes = []
+        self.enemies = EntityStore(ENEMY_COLUMNS, ENEMY_CAPACITY)
+        self.bullets = EntityStore(BULLET_COLUMNS, BULLET_CAPACITY)
+        self.goal = (0,0,0,0,0)
+        self.max_enemies = 20
+        self.enemy_spawn_interval = (90, 150)
+        self.shooter_interval = (100, 160)
+        self.enemy_spawn_timer = 0
+        self.coins = []
+        self.score = 0
+        self.level_seed = 0
+        self.level_cache = None  # LevelCache to map generated levels from instead of regenerating
+        self.level_file = None
+        self.telemetry = None  # TelemetryWriter to report gameplay events to; nothing reads them back
+        self.chunks = {}
+        self.chunk_window = None
+        self.collected_coins = set()
+        self.killed_enemies = set()  # (chunk index, ordinal) of level enemies that stay dead
+
+        # Broad-phase indexes over the loaded level geometry
+        self.stage_grid = SpatialGrid()
+        self.spike_grid = SpatialGrid()
+        self.coin_grid = SpatialGrid()
+
+        # Enemy navigation around the player, rebuilt from the loaded geometry whenever flow_key
+        # changes; flow_key is (level_seed, x0, width, target col, target row)
+        self.nav = NavGrid(SCREEN_HEIGHT)
+        self.flow_key = None
+
+        # Game State
+        self.game_started = False
+        self.level_initialized = False
+        self.time_left = 180 * 60
+        self.game_over = False
+        self.game_clear = False
+        self.start_protection_timer = 0
+
+    # The countdowns the game logic reads and sets, derived from the deadlines above
+
+    @property
+    def invincible_timer(self):
+        return max(self.invincible_until - self.tick, 0)
+
+    @invincible_timer.setter
+    def invincible_timer(self, ticks):
+        self.invincible_until = self.tick + ticks
+
+    @property
+    def player_shoot_cooldown(self):
+        return max(self.shoot_ready_at - self.tick, 0)
+
+    @player_shoot_cooldown.setter
+    def player_shoot_cooldown(self, ticks):
+        self.shoot_ready_at = self.tick + ticks
+
+    @property
+    def start_protection_timer(self):
+        return max(self.protection_until - self.tick, 0)
+
+    @start_protection_timer.setter
+    def start_protection_timer(self, ticks):
+        self.protection_until = self.tick + ticks
+
+    @property
+    def enemy_spawn_timer(self):
+        return max(self.spawn_at - self.tick, 0)
+
+    @enemy_spawn_timer.setter
+    def enemy_spawn_timer(self, ticks):
+        self.spawn_at = self.tick + ticks
+        self.events.schedule(self.spawn_at, EVENT_SPAWN)
+
+    @property
+    def time_left(self):
+        return max(self.time_up_at - self.tick, 0)
+
+    @time_left.setter
+    def time_left(self, ticks):
+        self.time_up_at = self.tick + ticks
+        self.events.schedule(self.time_up_at, EVENT_TIME_UP)
+
+    @property
+    def weapon_type(self):
+        return WEAPONS[self.weapon].name
+
+    @weapon_type.setter
+    def weapon_type(self, name):
+        self.weapon = WEAPON_IDS[name]
+
+    @property
+    def current_ammo(self):
+        return getattr(self, WEAPONS[self.weapon].ammo_attr)
+
+    def btn(self, mask):
+        return self.inputs & mask != 0
+
+    def btnp(self, mask):
+        return self.pressed & mask != 0
+
+    def btnr(self, mask):
+        return self.released & mask != 0
+
+    def emit(self, kind, a=0, b=0):
+        if self.telemetry is not None:
+            self.telemetry.record(self, kind, a, b)
+
+    def step(self, inputs=0):
+        self.pressed = inputs & ~self.prev_inputs
+        self.released = self.prev_inputs & ~inputs
+        self.inputs = inputs
+        self.prev_inputs = inputs
+        self.frame += 1
+        self.update()
+
+    def snapshot(self):
+        return GameState.capture(self)
+
+    def restore(self, state):
+        state.restore(self)
+
+    def state_hash(self):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((
+            self.frame, self.level_seed, self.camera_x, self.player_x, self.player_y, self.player_vy,
+            self.player_health, self.jumps_left, self.invincible_timer, self.player_shoot_cooldown,
+            self.player_direction, self.weapon, self.charge_level, self.enemy_kill_count,
+            tuple(getattr(self, weapon.ammo_attr) for weapon in WEAPONS), self.distance_moved,
+            self.collected_coins_for_heart, self.enemy_spawn_timer, self.score, self.time_left,
+            self.game_started, self.game_paused, self.game_over, self.game_clear,
+            self.start_protection_timer, len(self.coins), len(self.killed_enemies), self.upgrade_items.values(), self.hearts.values(),
+            self.tick, self.events.queue, self.flow_key,
+        )).encode())
+        for store in (self.enemies, self.bullets):
+            for name in store.columns:
+                h.update(getattr(store, name)[:store.count].tobytes())
+        return h.digest()
+
+    def setup_level(self, cached=True):
+        self.stage.clear()
+        self.spikes.clear()
+        self.enemies.clear()
+        self.bullets.clear()
+        self.coins.clear()
+        self.upgrade_items.clear()
+        self.hearts.clear()
+
+        # The level is generated lazily, chunk by chunk, as the camera approaches
+        self.level_seed = self.level_rng.getrandbits(32)
+        if cached:
+            self.open_level()
+        else:
+            self.release_level()
+        self.chunks = {}
+        self.chunk_window = None
+        self.collected_coins = set()
+        self.killed_enemies = set()
+        self.stage_grid.clear()
+        self.spike_grid.clear()
+        self.coin_grid.clear()
+        self.flow_key = None
+
+        # Drop the old level's shooter events; the world timers carry over
+        self.events.clear()
+        self.events.schedule(self.spawn_at, EVENT_SPAWN)
+        self.events.schedule(self.time_up_at, EVENT_TIME_UP)
+        self.stream_level()
+
+        self.goal = (self.world_width - 40, 116, 8, 16, 11)
+
+    def stream_level(self):
+        first = max(int(self.camera_x - CHUNK_LOAD_MARGIN) // CHUNK_WIDTH, 0)
+        last = min(int(self.camera_x + SCREEN_WIDTH + CHUNK_LOAD_MARGIN) // CHUNK_WIDTH,
+                   chunk_count(self.world_width) - 1)
+        if (first, last) == self.chunk_window:
+            return
+        self.chunk_window = (first, last)
+
+        # Keep one extra chunk on each side so turning around doesn't thrash
+        for index in [i for i in self.chunks if i < first - 1 or i > last + 1]:
+            self.unload_chunk(index)
+        for index in range(first, last + 1):
+            if index not in self.chunks:
+                self.load_chunk(index)
+
+        self.refresh_level_lists()
+
+        # Enemies and pickups left outside the loaded chunks go with them
+        low = min(self.chunks) * CHUNK_WIDTH
+        high = (max(self.chunks) + 1) * CHUNK_WIDTH
+        n = self.enemies.count
+        x = self.enemies.x[:n]
+        self.enemies.kill((x + 8 < low) | (x >= high))
+        self.enemies.compact()
+        for pool in (self.upgrade_items, self.hearts):
+            active = pool.active
+            for i in range(len(active) - 1, -1, -1):
+                if not low - 8 < active[i].x < high:
+                    pool.release_at(i)
+
+    def refresh_level_lists(self):
+        chunks = [self.chunks[i] for i in sorted(self.chunks)]
+        self.stage = [rect for chunk in chunks for rect in chunk.stage]
+        self.spikes = [rect for chunk in chunks for rect in chunk.spikes]
+        self.coins = [coin for chunk in chunks for coin in chunk.coins if coin not in self.collected_coins]
+
+    def reindex_level(self):
+        self.stage_grid.clear()
+        self.spike_grid.clear()
+        self.coin_grid.clear()
+        for chunk in self.chunks.values():
+            self.index_chunk(chunk)
+        self.refresh_level_lists()
+
+    def open_level(self):
+        level_file = None
+        if self.level_cache is not None:
+            level_file = self.level_cache.open(self.level_seed, self.world_width, self.enemy_safe_zone)
+        self.release_level()
+        self.level_file = level_file
+
+    def release_level(self):
+        # Lets the cache unmap the current level file once no other world is reading it
+        if self.level_file is not None:
+            self.level_cache.release(self.level_file)
+            self.level_file = None
+
+    def next_level_seed(self):
+        # The seed the next setup_level will draw, without drawing it
+        rng = random.Random()
+        rng.setstate(self.level_rng.getstate())
+        return rng.getrandbits(32)
+
+    def make_chunk(self, index):
+        if self.level_file is not None:
+            return self.level_file.chunk(index)
+        return generate_chunk(self.level_seed, index, self.world_width, self.enemy_safe_zone)
+
+    def load_chunk(self, index):
+        chunk = self.make_chunk(index)
+        self.chunks[index] = chunk
+        self.index_chunk(chunk)
+        for ordinal, enemy in enumerate(chunk.enemies):
+            if (index, ordinal) in self.killed_enemies:
+                continue
+            row = self.enemies.add(origin=index * ORIGIN_STRIDE + ordinal + 1, **enemy)
+            if ENEMY_KINDS[enemy['kind']].shoots:
+                self.events.schedule(self.tick + enemy['timer'], EVENT_SHOOT, int(self.enemies.uid[row]))
+
+    def index_chunk(self, chunk):
+        for rect in chunk.stage:
+            self.stage_grid.insert(rect, *rect[:4])
+        for rect in chunk.spikes:
+            self.spike_grid.insert(rect, *rect[:4])
+        for coin in chunk.coins:
+            if coin not in self.collected_coins:
+                self.coin_grid.insert(coin, *coin[:4])
+
+    def unload_chunk(self, index):
+        chunk = self.chunks.pop(index)
+        for rect in chunk.stage:
+            self.stage_grid.remove(rect, *rect[:4])
+        for rect in chunk.spikes:
+            self.spike_grid.remove(rect, *rect[:4])
+        for coin in chunk.coins:
+            self.coin_grid.remove(coin, *coin[:4])
+
+    def update(self):
+        if self.game_paused:
+            if self.btnp(BTN_UP):
+                self.weapon_selection = (self.weapon_selection - 1) % len(UPGRADE_WEAPONS)
+            if self.btnp(BTN_DOWN):
+                self.weapon_selection = (self.weapon_selection + 1) % len(UPGRADE_WEAPONS)
+            if self.btnp(BTN_CONFIRM):
+                self.weapon = UPGRADE_WEAPONS[self.weapon_selection].id
+                self.game_paused = False
+                self.emit(LOG_WEAPON)
+            return
+
+        if not self.game_started:
+            if self.btnp(BTN_JUMP) or self.btnp(BTN_CONFIRM):
+                self.game_started = True
+                self.start_protection_timer = 180
+                if not self.level_initialized:
+                    self.setup_level()
+                    self.level_initialized = True
+                self.emit(LOG_RUN_START)
+            return
+
+        if self.game_over or self.game_clear:
+            if self.btnp(BTN_RESTART):
+                self.restart()
+            return
+
+        self.tick += 1
+        self.update_player()
+        self.update_enemies()
+        self.update_bullets()
+        self.check_collisions()
+        self.update_camera()
+        self.stream_level()
+        if self.game_over or self.game_clear:
+            self.emit(LOG_CLEAR if self.game_clear else LOG_GAME_OVER, self.score, self.enemy_kill_count)
+
+    def update_player(self):
+        # Track horizontal movement for ammo replenishment
+        self.distance_moved += abs(self.player_x - self.last_player_x)
+        self.last_player_x = self.player_x
+
+        weapon = WEAPONS[self.weapon]
+        if self.distance_moved >= 120:
+            setattr(self, weapon.ammo_attr, getattr(self, weapon.max_ammo_attr))
+            self.distance_moved = 0
+
+        if self.btn(BTN_LEFT):
+            self.player_x = max(self.player_x - PLAYER_SPEED, 0)
+            self.player_direction = -1
+        if self.btn(BTN_RIGHT):
+            self.player_x = min(self.player_x + PLAYER_SPEED, self.world_width - 8)
+            self.player_direction = 1
+
+        self.player_y += self.player_vy
+        self.player_vy = min(self.player_vy + 0.5, 3)
+
+        on_ground = self.check_ground_collision()
+        if on_ground:
+            self.player_vy = 0
+            self.jumps_left = 2
+
+        if self.btnp(BTN_JUMP) and self.jumps_left > 0:
+            if self.jumps_left == 2:
+                self.player_vy = -6
+            else:
+                self.player_vy = -5
+            self.jumps_left -= 1
+
+        weapon.update(self, weapon, self.btn(BTN_FIRE), self.btnr(BTN_FIRE))
+
+    def check_ground_collision(self):
+        for x, y, w, h, col in self.stage_grid.query(self.player_x, self.player_y, 8, 8):
+            if (self.player_x + 8 > x and self.player_x < x + w and
+                self.player_y + 8 > y and self.player_y < y + h and self.player_vy >= 0):
+                self.player_y = y - 8
+                return True
+        return False
+
+    def run_events(self):
+        # Time-up is handled here too: nothing later in the tick reads game_over
+        for due, kind, payload in self.events.pop_due(self.tick):
+            if kind == EVENT_SPAWN:
+                if due == self.spawn_at:
+                    self.spawn_enemy()
+            elif kind == EVENT_SHOOT:
+                self.shooter_fire(payload)
+            elif kind == EVENT_TIME_UP:
+                if due == self.time_up_at:
+                    self.game_over = True
+
+    def spawn_enemy(self):
+        if len(self.enemies) >= self.max_enemies:
+            # At the cap: try again next tick
+            self.spawn_at = self.tick + 1
+            self.events.schedule(self.spawn_at, EVENT_SPAWN)
+            return
+        spawn_x = self.camera_x + SCREEN_WIDTH + 10
+        spawn_y = self.spawn_rng.choice([124, 100, 84])
+        archetype = self.spawn_rng.choice(SPAWN_KINDS)
+        values = {field: self.spawn_rng.uniform(low, high) for field, (low, high) in archetype.spawn.items()}
+        row = self.enemies.add(x=spawn_x, y=spawn_y, kind=archetype.id, color=archetype.color, **values)
+        if archetype.shoots:
+            self.events.schedule(self.tick + self.ai_rng.randint(*self.shooter_interval), EVENT_SHOOT,
+                                 int(self.enemies.uid[row]))
+        self.enemy_spawn_timer = self.spawn_rng.randint(*self.enemy_spawn_interval)
+
+    def shooter_fire(self, uid):
+        row = self.enemies.row_of(uid)
+        if row < 0:
+            return  # killed or unloaded since the event was scheduled
+        ex = float(self.enemies.x[row])
+        ey = float(self.enemies.y[row])
+        dx = self.player_x - ex
+        if abs(dx) >= SHOOTER_RANGE:
+            # Out of range: sleep until the earliest tick the two could have closed the distance
+            closing = PLAYER_SPEED + ENEMY_KINDS[self.enemies.kind[row]].max_speed
+            wait = int((abs(dx) - SHOOTER_RANGE) // closing) + 1
+            self.events.schedule(self.tick + wait, EVENT_SHOOT, uid)
+            return
+        nav = self.navigation()
+        if nav is not None and not nav.line_of_sight(ex + 4, ey + 4, self.player_x + 4, self.player_y + 4):
+            # Hold fire until the player steps out from behind cover. The grid and its memoised
+            # sight lines only change when the flow field is retargeted, so look again then.
+            retarget = self.tick - self.tick % FLOW_FIELD_INTERVAL + FLOW_FIELD_INTERVAL
+            self.events.schedule(retarget, EVENT_SHOOT, uid)
+            return
+        dy = self.player_y - ey
+        dist = (dx**2 + dy**2)**0.5
+        if dist > 0:
+            self.bullets.add(
+                x=ex + 4, y=ey + 4,
+                vx=(dx / dist) * 2, vy=(dy / dist) * 2, color=8, owner=OWNER_ENEMY, size=2
+            )
+        self.events.schedule(self.tick + self.ai_rng.randint(*self.shooter_interval), EVENT_SHOOT, uid)
+
+    def navigation(self):
+        # The NavGrid for the current flow_key, or None before the first one is chosen
+        if self.flow_key is None:
+            return None
+        if self.nav.key != self.flow_key:
+            level_seed, x0, width, col, row = self.flow_key
+            rects = self.stage_grid.query(x0, 0, width, SCREEN_HEIGHT) + self.spike_grid.query(x0, 0, width, SCREEN_HEIGHT)
+            self.nav.build(self.flow_key, x0, width, rects, col, row)
+        return self.nav
+
+    def update_enemies(self):
+        # Retarget the shared flow field on the player every few ticks
+        if self.flow_key is None or self.tick % FLOW_FIELD_INTERVAL == 0:
+            x0 = max(int(self.camera_x) - NAV_MARGIN, 0) // NAV_CELL * NAV_CELL
+            width = min(SCREEN_WIDTH + 2 * NAV_MARGIN, self.world_width - x0)
+            self.flow_key = (self.level_seed, x0, width) + self.nav.cell_of(self.player_x + 4, self.player_y + 4)
+        self.run_events()
+
+        enemies = self.enemies
+        n = enemies.count
+        x = enemies.x[:n]
+        kind = enemies.kind[:n]
+
+        # One batched update per kind present, looked up by ID
+        for k in np.flatnonzero(np.bincount(kind, minlength=len(ENEMY_KINDS))).tolist():
+            archetype = ENEMY_KINDS[k]
+            archetype.update(self, archetype, np.flatnonzero(kind == k))
+
+        if self.start_protection_timer > 0:
+            transient = np.array([archetype.spawn is not None for archetype in ENEMY_KINDS])[kind]
+            enemies.kill(transient & ((x < self.enemy_safe_zone) | (x < self.camera_x - 20)))
+            enemies.compact()
+
+    def update_bullets(self):
+        bullets = self.bullets
+        n = bullets.count
+        x = bullets.x[:n]
+        y = bullets.y[:n]
+        x += bullets.vx[:n]
+        y += bullets.vy[:n]
+        bullets.kill((x < self.camera_x - 10) | (x > self.camera_x + SCREEN_WIDTH + 10) |
+                     (y < -10) | (y > SCREEN_HEIGHT + 10))
+        bullets.compact()
+
+    def check_collisions(self):
+        enemies = self.enemies
+        bullets = self.bullets
+        ne = enemies.count
+        nb = bullets.count
+        ex = enemies.x[:ne]
+        ey = enemies.y[:ne]
+        bx = bullets.x[:nb]
+        by = bullets.y[:nb]
+        bsize = bullets.size[:nb]
+        owner = bullets.owner[:nb]
+
+        # Broad phase for enemies: sort by x once, then each query is a searchsorted interval
+        order = np.argsort(ex, kind='stable')
+        sorted_x = ex[order]
+
+        if self.invincible_timer == 0:
+            near = order[np.searchsorted(sorted_x, self.player_x - 6, side='right'):
+                         np.searchsorted(sorted_x, self.player_x + 6, side='left')]
+            if np.any(np.abs(self.player_y - ey[near]) < 6):
+                self.player_health -= 1; self.invincible_timer = 120
+                if self.player_health <= 0: self.game_over = True
+        if self.invincible_timer == 0:
+            hits = np.flatnonzero((owner == OWNER_ENEMY) & (np.abs(self.player_x - bx) < 4) & (np.abs(self.player_y - by) < 4))
+            if len(hits):
+                self.player_health -= 1
+                self.invincible_timer = 120
+                bullets.kill(hits[0])
+                if self.player_health <= 0: self.game_over = True
+
+        if ne:
+            enemy_alive = enemies.alive[:ne]
+            shots = np.flatnonzero(owner == OWNER_PLAYER)
+            # Enemies overlapping a bullet on x satisfy bx - 8 < ex < bx + size
+            starts = np.searchsorted(sorted_x, bx[shots] - 8, side='right')
+            ends = np.searchsorted(sorted_x, bx[shots] + bsize[shots], side='left')
+            for b, start, end in zip(shots.tolist(), starts.tolist(), ends.tolist()):
+                if start == end:
+                    continue
+                near = order[start:end]
+                # AABB collision detection
+                hits = near[enemy_alive[near] & (by[b] < ey[near] + 8) & (by[b] + bsize[b] > ey[near])]
+                if len(hits):
+                    e = hits.min()
+                    enemies.kill(e)
+                    origin = int(enemies.origin[e])
+                    if origin:
+                        self.killed_enemies.add(divmod(origin - 1, ORIGIN_STRIDE))
+                    self.score += 50
+                    self.enemy_kill_count += 1
+                    self.emit(LOG_KILL, int(enemies.kind[e]), self.score)
+                    if self.enemy_kill_count % 10 == 0:
+                        self.upgrade_items.spawn(float(ex[e]), float(ey[e]), 4, 4, 11)
+
+                    # Piercing shots (the charge shot) keep going
+                    if not WEAPONS[self.weapon].pierce:
+                        bullets.kill(b)
+        enemies.compact()
+        bullets.compact()
+
+        if self.invincible_timer == 0:
+            for x, y, w, h, col in self.spike_grid.query(self.player_x, 0, 8, SCREEN_HEIGHT):
+                if (self.player_x + 7 > x and self.player_x < x + w -1 and self.player_y + 7 > y):
+                    self.player_health -= 1; self.invincible_timer = 120
+                    if self.player_health <= 0: self.game_over = True
+                    break
+
+        for coin in self.coin_grid.query(self.player_x, self.player_y, 8, 8):
+            cx, cy, cw, ch, ccol = coin
+            if (self.player_x + 8 > cx and self.player_x < cx + cw and
+                self.player_y + 8 > cy and self.player_y < cy + ch):
+                self.coins.remove(coin)
+                self.coin_grid.remove(coin, cx, cy, cw, ch)
+                self.collected_coins.add(coin)
+                self.score += 10
+                self.collected_coins_for_heart += 1
+                if self.collected_coins_for_heart >= 10:
+                    self.hearts.spawn(self.player_x, self.player_y, 8, 8, 8) # Red heart
+                    self.collected_coins_for_heart = 0
+
+        hearts = self.hearts.active
+        for i in range(len(hearts) - 1, -1, -1):
+            heart = hearts[i]
+            if (self.player_x + 8 > heart.x and self.player_x < heart.x + heart.w and
+                self.player_y + 8 > heart.y and self.player_y < heart.y + heart.h):
+                self.hearts.release_at(i)
+                self.player_health = min(self.player_health + 1, 3) # Max 3 health
+
+        items = self.upgrade_items.active
+        for i in range(len(items) - 1, -1, -1):
+            item = items[i]
+            if (self.player_x + 8 > item.x and self.player_x < item.x + item.w and
+                self.player_y + 8 > item.y and self.player_y < item.y + item.h):
+                self.upgrade_items.release_at(i)
+                self.game_paused = True
+
+        gx, gy, gw, gh, gcol = self.goal
+        if (self.player_x + 8 > gx and self.player_x < gx + gw and self.player_y + 8 > gy and self.player_y < gy + gh):
+            self.game_clear = True
+        if self.player_y > SCREEN_HEIGHT: self.game_over = True
+
+    def update_camera(self):
+        self.camera_x = max(0, min(self.player_x - SCREEN_WIDTH / 2, self.world_width - SCREEN_WIDTH))
+
+    def restart(self):
+        self.camera_x = 0
+        self.player_x = self.player_start_x
+        self.player_y = 120
+        self.player_vy = 0
+        self.player_health = 3
+        self.jumps_left = 2
+        self.invincible_timer = 0
+        self.player_shoot_cooldown = 0
+        self.player_direction = 1
+        self.weapon = WEAPON_NORMAL
+        self.charge_level = 0
+        self.enemy_kill_count = 0
+        self.upgrade_items.clear()
+        self.game_paused = False
+        self.coins.clear()
+        self.bullets.clear()
+        self.score = 0
+        for weapon in WEAPONS:
+            setattr(self, weapon.ammo_attr, getattr(self, weapon.max_ammo_attr))
+        self.distance_moved = 0
+        self.last_player_x = self.player_start_x
+        self.collected_coins_for_heart = 0
+        self.hearts.clear()
+        # START sets up the next level, so this one is never played: generate its chunks on the
+        # spot rather than writing it to the level cache
+        self.setup_level(cached=False)
+        self.enemy_spawn_timer = 0
+        self.time_left = 180 * 60
+        self.game_over = False
+        self.game_clear = False
+        self.game_started = False
+        self.level_initialized = False